@@ -0,0 +1,86 @@
+"""Benchmark the tokenization cost of chunking a large corpus.
+
+Compares the old fixed-size token slicing, sentence-aware chunking with one batched
+tokenizer call per paper, and the same chunking with one tokenizer call per sentence.
+
+    python benchmarks/bench_chunking.py --papers 200 --words 12000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from litsummarizer_chunking import chunk_text, get_tokenizer, split_sentences
+
+WORDS = (
+    "innovation patent firm data growth market policy research effect model results evidence "
+    "estimate sample regression variable productivity investment technology diffusion spillover"
+).split()
+
+
+def synthetic_paper(rng, n_words):
+    sentences = []
+    while n_words > 0:
+        length = rng.randint(8, 30)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+        n_words -= length
+        if rng.random() < 0.05:
+            sentences.append(f"\n\n{rng.randint(1, 9)}. Section\n")
+    return " ".join(sentences)
+
+
+def fixed_slices(text, tokenizer, max_tokens, overlap_tokens):
+    tokens = tokenizer.encode(text)
+    return [tokenizer.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def unbatched_chunk_text(text, tokenizer, max_tokens, overlap_tokens):
+    class PerSentence:
+        def encode_ordinary_batch(self, texts):
+            return [tokenizer.encode_ordinary(t) for t in texts]
+
+        def decode(self, tokens):
+            return tokenizer.decode(tokens)
+
+    return chunk_text(text, max_tokens, overlap_tokens, tokenizer=PerSentence())
+
+
+def batched_chunk_text(text, tokenizer, max_tokens, overlap_tokens):
+    return chunk_text(text, max_tokens, overlap_tokens, tokenizer=tokenizer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--words", type=int, default=10000, help="words per synthetic paper")
+    parser.add_argument("--max-tokens", type=int, default=3096)
+    parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [synthetic_paper(rng, args.words) for _ in range(args.papers)]
+    tokenizer = get_tokenizer()
+    total_mb = sum(len(text) for text in corpus) / 1e6
+    total_tokens = sum(len(tokens) for tokens in tokenizer.encode_ordinary_batch(corpus))
+    total_sentences = sum(len(split_sentences(text)) for text in corpus)
+    print(f"Corpus: {args.papers} papers, {total_mb:.1f} MB, {total_tokens} tokens, {total_sentences} sentences")
+    print(f"{'strategy':<22}{'seconds':>10}{'MB/s':>10}{'Mtok/s':>10}{'chunks':>10}")
+
+    for name, chunker in [
+        ("fixed slices (old)", fixed_slices),
+        ("sentences, batched", batched_chunk_text),
+        ("sentences, unbatched", unbatched_chunk_text),
+    ]:
+        start = time.perf_counter()
+        chunks = sum(len(chunker(text, tokenizer, args.max_tokens, args.overlap)) for text in corpus)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22}{elapsed:>10.2f}{total_mb / elapsed:>10.2f}{total_tokens / elapsed / 1e6:>10.2f}{chunks:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark near-duplicate detection over a large synthetic corpus.
+
+Generates random papers plus edited copies of some of them (words replaced, a header added,
+as between a preprint and its published version), then times signing every paper and finding
+duplicates with the LSH index against comparing every pair of signatures. Reports how many of
+the planted copies were found and how many unrelated papers were matched.
+
+    python benchmarks/bench_dedup.py --papers 5000 --words 8000 --duplicates 0.1 --edits 0.03
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from litsummarizer_dedup import DEDUP_THRESHOLD, DuplicateIndex, similarity, text_signature
+
+
+def vocabulary(rng, size):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def synthetic_paper(rng, vocab, weights, n_words):
+    return ' '.join(rng.choices(vocab, weights, k=n_words))
+
+
+def edited_copy(rng, vocab, text, edits):
+    """Replace a fraction of the words and prepend a journal header, like a published version."""
+    words = text.split()
+    for i in rng.sample(range(len(words)), int(len(words) * edits)):
+        words[i] = rng.choice(vocab)
+    header = f"Journal of {rng.choice(vocab).title()} Vol. {rng.randint(1, 60)} (2021) pp. 1-40"
+    return header + '\n' + ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=2000, help="number of distinct papers")
+    parser.add_argument("--words", type=int, default=6000, help="words per synthetic paper")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="fraction of papers that get an edited copy")
+    parser.add_argument("--edits", type=float, default=0.03, help="fraction of words changed in each copy")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument("--pairwise-limit", type=int, default=3000,
+                        help="skip the all-pairs comparison above this many papers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = vocabulary(rng, args.vocabulary)
+    weights = [1 / rank for rank in range(1, len(vocab) + 1)]  # Zipf-like word frequencies
+    texts = [synthetic_paper(rng, vocab, weights, args.words) for _ in range(args.papers)]
+    planted = {}
+    for original in rng.sample(range(args.papers), int(args.papers * args.duplicates)):
+        planted[len(texts)] = original
+        texts.append(edited_copy(rng, vocab, texts[original], args.edits))
+    order = list(range(len(texts)))
+    rng.shuffle(order)
+    print(f"Corpus: {len(texts)} papers ({len(planted)} edited copies), {args.words} words each")
+
+    start = time.perf_counter()
+    signatures = {i: text_signature(texts[i]) for i in order}
+    sign_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = DuplicateIndex(threshold=args.threshold)
+    found = {}
+    for i in order:
+        match = index.add(i, signatures[i])
+        if match is not None:
+            found[i] = match[0]
+    lsh_seconds = time.perf_counter() - start
+
+    pairs_found = {frozenset((i, j)) for i, j in found.items()}
+    pairs_planted = {frozenset((i, j)) for i, j in planted.items()}
+    print(f"{'signatures':<12}{sign_seconds:>9.2f} s  ({1000 * sign_seconds / len(texts):.2f} ms per paper)")
+    print(f"{'LSH index':<12}{lsh_seconds:>9.2f} s  found {len(pairs_found & pairs_planted)}/{len(pairs_planted)} "
+          f"copies, {len(pairs_found - pairs_planted)} false matches")
+
+    if len(texts) <= args.pairwise_limit:
+        start = time.perf_counter()
+        pairwise = {
+            frozenset((order[a], order[b]))
+            for a in range(len(order)) for b in range(a)
+            if similarity(signatures[order[a]]["minhash"], signatures[order[b]]["minhash"]) >= args.threshold
+        }
+        pairwise_seconds = time.perf_counter() - start
+        print(f"{'all pairs':<12}{pairwise_seconds:>9.2f} s  found {len(pairwise & pairs_planted)}/{len(pairs_planted)} "
+              f"copies, {len(pairwise - pairs_planted)} false matches  ({pairwise_seconds / lsh_seconds:.0f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""End-to-end offline benchmark for both entry points.
+
+Generates a synthetic PDF corpus, starts the mock OpenAI server and runs the realtime pipeline
+(litsummarizer.process_folder) and/or the batch pipeline (prepare, submit, poll, collect) against
+it with a cold cache. Reports papers/sec, extraction time per page, tokens sent and peak RSS.
+With --mode both, each mode runs in a process of its own so its peak RSS is its own.
+
+    python benchmarks/bench_pipeline.py --papers 200 --pages 12 --latency 0.3 --error-rate 0.05
+
+The batch failure options make the mock fail requests inside batches and expire or fail whole
+batches, so the job manager's resubmission of failed requests is exercised too:
+
+    python benchmarks/bench_pipeline.py --mode batch --batch-error-rate 0.1 --batch-expire-rate 0.3
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_openai import MockOpenAI
+from synthetic_corpus import generate_corpus
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its (extraction worker) children, in MB."""
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+    return own, children
+
+
+def bench_extraction(paths, pages):
+    from litsummarizer_extract import extract_many
+
+    start = time.perf_counter()
+    failures = sum(1 for _, _, error in extract_many(paths) if error is not None)
+    elapsed = time.perf_counter() - start
+    return {
+        "extract_seconds": elapsed,
+        "extract_ms_per_page": 1000 * elapsed / (len(paths) * pages),
+        "extract_failures": failures,
+    }
+
+
+def bench_realtime(corpus, workdir, mock):
+    import litsummarizer
+
+    before = dict(mock.stats)
+    start = time.perf_counter()
+    litsummarizer.process_folder(corpus, os.path.join(workdir, "realtime_summaries.xlsx"))
+    elapsed = time.perf_counter() - start
+    return elapsed, {key: mock.stats[key] - before[key] for key in mock.stats}
+
+
+def bench_batch(corpus, workdir, mock):
+    import litsummarizer_batchmode as batchmode
+    import litsummarizer_jobs
+
+    # The mock finishes batches in seconds, so poll accordingly
+    litsummarizer_jobs.MIN_POLL_INTERVAL = min(litsummarizer_jobs.MIN_POLL_INTERVAL, mock.batch_delay / 2)
+    litsummarizer_jobs.MAX_POLL_INTERVAL = max(1.0, mock.batch_delay)
+
+    before = dict(mock.stats)
+    start = time.perf_counter()
+    jsonl_file = os.path.join(workdir, "batch_input.jsonl")
+    jsonl_files = batchmode.prepare_batch_input_for_batch_api(corpus, jsonl_file)
+    manager = litsummarizer_jobs.BatchJobManager(
+        batchmode.openai.api_key, state_path=os.path.join(workdir, "batch_jobs.json"),
+        output_dir=os.path.join(workdir, "batch_outputs"), api_base=mock.base_url
+    )
+    manager.add_inputs(jsonl_files)
+    manager.submit_inputs()
+    manager.run()
+    # A second round of batches condenses the answers of multi-chunk papers
+    while batchmode.collect_batches(jsonl_file, os.path.join(workdir, "batch_summaries.xlsx"), manager) is False:
+        manager.run()
+    elapsed = time.perf_counter() - start
+    return elapsed, {key: mock.stats[key] - before[key] for key in mock.stats}
+
+
+def run_benchmark(args):
+    """Generate the corpus and run args.mode against a fresh mock; returns the report."""
+    workdir = tempfile.mkdtemp(prefix="litsummarizer-bench-")
+    corpus = os.path.join(workdir, "corpus")
+    mock = MockOpenAI(latency=args.latency, error_rate=args.error_rate, batch_delay=args.batch_delay,
+                      batch_error_rate=args.batch_error_rate, batch_expire_rate=args.batch_expire_rate,
+                      batch_fail_rate=args.batch_fail_rate)
+
+    # Configure the entry points before importing them: they read these at import time
+    os.environ["OPENAI_BASE_URL"] = mock.start()
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["LITSUMMARIZER_CACHE"] = os.path.join(workdir, "cache.sqlite")
+    os.environ["LITSUMMARIZER_TOKENS_PER_MINUTE"] = str(args.tokens_per_minute)
+    os.environ["LITSUMMARIZER_MAX_CONCURRENCY"] = str(args.concurrency)
+
+    report = {
+        "papers": args.papers, "pages": args.pages, "latency": args.latency, "error_rate": args.error_rate,
+        "tokens_per_minute": args.tokens_per_minute, "concurrency": args.concurrency,
+    }
+    try:
+        start = time.perf_counter()
+        paths = generate_corpus(corpus, args.papers, args.pages)
+        report["generate_seconds"] = time.perf_counter() - start
+        report.update(bench_extraction(paths, args.pages))
+
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for mode, bench in [("realtime", bench_realtime), ("batch", bench_batch)]:
+                if args.mode != mode:
+                    continue
+                elapsed, stats = bench(corpus, workdir, mock)
+                report[mode] = {
+                    "seconds": elapsed,
+                    "papers_per_second": args.papers / elapsed,
+                    "chat_requests": stats["chat_requests"],
+                    "rate_limited": stats["rate_limited"],
+                    "batch_requests": stats["batch_requests"],
+                    "prompt_tokens_sent": stats["prompt_tokens"] + stats["batch_prompt_tokens"],
+                    "batches": stats["batches_created"],
+                    "batches_expired": stats["batches_expired"],
+                    "batches_failed": stats["batches_failed"],
+                    "batch_requests_failed": stats["batch_requests_failed"],
+                }
+                report[mode]["peak_rss_mb"], report[mode]["peak_worker_rss_mb"] = peak_rss_mb()
+        finally:
+            os.chdir(cwd)
+    finally:
+        mock.stop()
+        if args.keep:
+            report.setdefault("workdirs", []).append(workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def run_modes_separately(args):
+    """Run each mode in a child process of its own and merge their reports.
+
+    ru_maxrss is the peak over a process's whole lifetime, so in one process the second mode
+    would report the first mode's peak whenever that was higher.
+    """
+    argv = []
+    for name, value in vars(args).items():
+        if name in ("mode", "json") or value is None or value is False:
+            continue
+        argv += [f"--{name.replace('_', '-')}"] + ([] if value is True else [str(value)])
+    report = {}
+    for mode in ("realtime", "batch"):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), *argv, "--mode", mode, "--json", path],
+                                   stdout=subprocess.PIPE, text=True)
+            if child.returncode:
+                print(child.stdout)
+                raise SystemExit(f"The {mode} benchmark failed with exit status {child.returncode}.")
+            with open(path, 'r') as f:
+                child_report = json.load(f)
+        finally:
+            os.remove(path)
+        # Corpus generation and extraction are reported from the first child
+        workdirs = report.get("workdirs", []) + child_report.pop("workdirs", [])
+        report = dict(child_report, **report)
+        report[mode] = child_report[mode]
+        if workdirs:
+            report["workdirs"] = workdirs
+    return report
+
+
+def print_report(report):
+    print(f"\nCorpus: {report['papers']} papers x {report['pages']} pages "
+          f"(generated in {report['generate_seconds']:.1f}s)")
+    print(f"Extraction: {report['extract_seconds']:.2f}s, {report['extract_ms_per_page']:.1f} ms/page, "
+          f"{report['extract_failures']} failures")
+    print(f"{'mode':<10}{'seconds':>10}{'papers/s':>10}{'chat req':>10}{'429s':>8}{'batch req':>11}"
+          f"{'tokens sent':>13}{'peak RSS MB':>13}")
+    for mode in ("realtime", "batch"):
+        if mode in report:
+            r = report[mode]
+            print(f"{mode:<10}{r['seconds']:>10.2f}{r['papers_per_second']:>10.2f}{r['chat_requests']:>10}"
+                  f"{r['rate_limited']:>8}{r['batch_requests']:>11}{r['prompt_tokens_sent']:>13}{r['peak_rss_mb']:>13.0f}")
+    if report.get("batch", {}).get("batches"):
+        r = report["batch"]
+        print(f"Batches: {r['batches']} submitted, {r['batches_expired']} expired, {r['batches_failed']} failed, "
+              f"{r['batch_requests_failed']} failed requests")
+    print("Largest extraction worker: " + ", ".join(
+        f"{report[mode]['peak_worker_rss_mb']:.0f} MB ({mode})" for mode in ("realtime", "batch") if mode in report
+    ))
+    for workdir in report.get("workdirs", []):
+        print(f"Working directory kept at {workdir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--mode", choices=["realtime", "batch", "both"], default="both")
+    parser.add_argument("--latency", type=float, default=0.1, help="mock seconds per chat request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of chat requests answered with 429")
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="mock seconds before a batch completes")
+    parser.add_argument("--batch-error-rate", type=float, default=0.0, help="fraction of batch requests that fail")
+    parser.add_argument("--batch-expire-rate", type=float, default=0.0, help="fraction of batches that expire half done")
+    parser.add_argument("--batch-fail-rate", type=float, default=0.0, help="fraction of batches that fail outright")
+    parser.add_argument("--tokens-per-minute", type=int, default=10000000,
+                        help="client-side token budget; lower it to benchmark rate-limit-bound runs")
+    parser.add_argument("--concurrency", type=int, default=16, help="client-side cap on in-flight requests")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directory")
+    args = parser.parse_args()
+
+    report = run_modes_separately(args) if args.mode == "both" else run_benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark text normalization over a large synthetic corpus.
+
+Compares the old regex-plus-chained-replace clean_text_for_excel and regex clean_text with the
+single-pass versions in litsummarizer_text, on whole papers and on summary-sized strings, and
+checks that both produce the same output.
+
+    python benchmarks/bench_text.py --papers 200 --words 12000 --punctuation 0.01
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from litsummarizer_text import clean_text, clean_text_for_excel
+
+WORDS = (
+    "innovation patent firm data growth market policy research effect model results evidence "
+    "estimate sample regression variable productivity investment technology diffusion spillover"
+).split()
+# Only characters the old implementation handled, so the outputs can be compared
+SPECIAL = ["“quoted”", "it’s", "‘a’", "1990–2000", "firm—level", "line\nbreak", "tab\there", "form\x0cfeed"]
+
+
+def legacy_clean_text_for_excel(text):
+    if text is None:
+        return ""
+
+    if not isinstance(text, str):
+        text = str(text)
+
+    text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', text)
+    text = text.replace('“', '"').replace('”', '"')
+    text = text.replace('’', "'").replace('‘', "'")
+    text = text.replace('–', '-')
+    text = text.replace('—', '-')
+
+    return text
+
+
+def legacy_clean_text(text):
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def synthetic_text(rng, n_words, punctuation):
+    words = (rng.choice(SPECIAL) if rng.random() < punctuation else rng.choice(WORDS) for _ in range(n_words))
+    return " ".join(words)
+
+
+def time_over(function, texts):
+    start = time.perf_counter()
+    outputs = [function(text) for text in texts]
+    return time.perf_counter() - start, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--words", type=int, default=10000, help="words per synthetic paper")
+    parser.add_argument("--summaries", type=int, default=50000, help="number of summary-sized strings")
+    parser.add_argument("--punctuation", type=float, default=0.01,
+                        help="fraction of words that carry curly quotes, dashes or control characters")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    papers = [synthetic_text(rng, args.words, args.punctuation) for _ in range(args.papers)]
+    summaries = [synthetic_text(rng, 50, args.punctuation) for _ in range(args.summaries)]
+    ascii_papers = [text.encode('ascii', 'ignore').decode('ascii') for text in papers]
+    papers_mb = sum(len(text) for text in papers) / 1e6
+    summaries_mb = sum(len(text) for text in summaries) / 1e6
+    print(f"Corpus: {args.papers} papers ({papers_mb:.1f} MB), {args.summaries} summaries ({summaries_mb:.1f} MB)")
+    print(f"{'function':<22}{'input':<18}{'old s':>9}{'new s':>9}{'speedup':>9}{'same':>6}")
+
+    for name, old, new in [
+        ("clean_text_for_excel", legacy_clean_text_for_excel, clean_text_for_excel),
+        ("clean_text", legacy_clean_text, clean_text),
+    ]:
+        for label, texts in [("papers", papers), ("papers, ASCII", ascii_papers), ("summaries", summaries)]:
+            old_seconds, old_outputs = time_over(old, texts)
+            new_seconds, new_outputs = time_over(new, texts)
+            print(f"{name:<22}{label:<18}{old_seconds:>9.3f}{new_seconds:>9.3f}"
+                  f"{old_seconds / new_seconds:>8.1f}x{str(old_outputs == new_outputs):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""A local stand-in for the OpenAI chat completions, files and batches endpoints.
+
+Used by the benchmarks (and handy for trying the batch job manager) so runs never hit the real
+API. Latency and 429 responses can be injected, and so can batch failures: requests that fail
+inside a batch, batches that expire half done and batches that fail outright. Every request is
+counted in `stats`.
+
+    python benchmarks/mock_openai.py --port 8765 --latency 0.2 --error-rate 0.05
+    python benchmarks/mock_openai.py --port 8765 --batch-error-rate 0.1 --batch-expire-rate 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python litsummarizer.py
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+
+def estimate_tokens(messages):
+    """About 4 characters per token, the same rule of thumb the client-side rate limiter uses."""
+    return sum(len(m["content"]) for m in messages) // 4 + 4 * len(messages)
+
+
+def fake_completion(body):
+    """Build a plausible chat completion for a request body, honouring JSON-schema response formats."""
+    messages = body.get("messages", [])
+    prompt = messages[-1]["content"] if messages else ""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        properties = response_format["json_schema"]["schema"]["properties"]
+        content = json.dumps({
+            name: 2020 if "integer" in str(spec.get("type")) else f"Synthetic answer for {name}."
+            for name, spec in properties.items()
+        })
+    elif "Title:" in prompt and "Authors:" in prompt:
+        content = "Title: Synthetic Paper\nAuthors: A. Author, B. Author\nYear: 2020"
+    else:
+        content = "This is a synthetic answer. It has two sentences."
+    prompt_tokens = estimate_tokens(messages)
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{random.getrandbits(48):x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class MockOpenAI:
+    """Threaded mock server; start() returns the base URL to point OPENAI_BASE_URL at."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, batch_delay=1.0, seed=0,
+                 batch_error_rate=0.0, batch_expire_rate=0.0, batch_fail_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.batch_delay = batch_delay
+        self.batch_error_rate = batch_error_rate
+        self.batch_expire_rate = batch_expire_rate
+        self.batch_fail_rate = batch_fail_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+        # How each batch will end: "completed", "expired" or "failed"
+        self.outcomes = {}
+        self.ids = itertools.count(1)
+        self.stats = {
+            "chat_requests": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "files_uploaded": 0, "batches_created": 0, "batches_cancelled": 0, "batch_requests": 0, "batch_prompt_tokens": 0,
+            "batches_expired": 0, "batches_failed": 0, "batch_requests_failed": 0,
+        }
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def _new_id(self, prefix):
+        with self.lock:
+            return f"{prefix}-{next(self.ids)}"
+
+    def _finish_batch(self, batch, status, answered):
+        """Answer the first `answered` requests of a batch, write its output and error files and give it its final status.
+
+        Each answered request fails with a 500 at batch_error_rate; the unanswered ones are
+        reported in the error file as not executed.
+        """
+        outputs, errors = [], []
+        for i, line in enumerate(self.files[batch["input_file_id"]].splitlines()):
+            request = json.loads(line)
+            entry = {"id": f"batch_req_{next(self.ids)}", "custom_id": request["custom_id"], "response": None, "error": None}
+            if i >= answered:
+                entry["error"] = {"code": f"batch_{status}", "message": f"The batch was {status} before this request ran."}
+                errors.append(json.dumps(entry))
+            elif self.batch_error_rate and self.random.random() < self.batch_error_rate:
+                entry["response"] = {"status_code": 500, "request_id": "", "body": {
+                    "error": {"message": "The server had an error while processing your request.", "type": "server_error"}
+                }}
+                errors.append(json.dumps(entry))
+            else:
+                entry["response"] = {"status_code": 200, "request_id": "", "body": fake_completion(request["body"])}
+                outputs.append(json.dumps(entry))
+        for kind, lines in (("output", outputs), ("error", errors)):
+            if lines:
+                batch[f"{kind}_file_id"] = f"file-{next(self.ids)}"
+                self.files[batch[f"{kind}_file_id"]] = ("\n".join(lines) + "\n").encode('utf-8')
+        batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+        self.stats["batch_requests_failed"] += len(errors)
+        batch.update(status=status, completed_at=int(time.time()))
+
+    def _batch_view(self, batch):
+        """Advance a batch to its outcome once batch_delay has passed, writing its output and error files.
+
+        An expired or cancelled batch stops with the first half of its requests answered; a
+        failed one has no output at all.
+        """
+        with self.lock:
+            if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.batch_delay:
+                outcome = self.outcomes[batch["id"]]
+                total = batch["request_counts"]["total"]
+                if outcome == "failed":
+                    batch.update(status="failed", failed_at=int(time.time()),
+                                 errors={"data": [{"code": "server_error", "message": "The batch failed."}]})
+                    self.stats["batches_failed"] += 1
+                elif outcome == "expired":
+                    self._finish_batch(batch, "expired", total // 2)
+                    self.stats["batches_expired"] += 1
+                else:
+                    self._finish_batch(batch, "completed", total)
+            elif batch["status"] == "cancelling":
+                self._finish_batch(batch, "cancelled", batch["request_counts"]["total"] // 2)
+            return {key: value for key, value in batch.items()}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload=None, raw=None, headers=None):
+                data = raw if raw is not None else json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                if self.path.endswith("/chat/completions"):
+                    body = json.loads(self._body())
+                    if mock.latency:
+                        time.sleep(mock.latency)
+                    if mock.error_rate and mock.random.random() < mock.error_rate:
+                        mock._count(rate_limited=1)
+                        return self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                          headers={"retry-after": "0.1"})
+                    completion = fake_completion(body)
+                    mock._count(chat_requests=1, prompt_tokens=completion["usage"]["prompt_tokens"],
+                                completion_tokens=completion["usage"]["completion_tokens"])
+                    return self._send(200, completion)
+
+                if self.path.endswith("/files"):
+                    raw = self._body()
+                    message = BytesParser(policy=policy.default).parsebytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('latin-1') + raw
+                    )
+                    content = next(
+                        part.get_payload(decode=True) for part in message.iter_parts()
+                        if part.get_param("name", header="content-disposition") == "file"
+                    )
+                    file_id = mock._new_id("file")
+                    with mock.lock:
+                        mock.files[file_id] = content
+                    mock._count(files_uploaded=1)
+                    return self._send(200, {"id": file_id, "object": "file", "bytes": len(content), "purpose": "batch"})
+
+                parts = self.path.rstrip('/').split('/')
+                if parts[-1] == "cancel" and parts[-2] in mock.batches:
+                    with mock.lock:
+                        batch = mock.batches[parts[-2]]
+                        if batch["status"] == "in_progress":
+                            batch["status"] = "cancelling"
+                        view = dict(batch)
+                    mock._count(batches_cancelled=1)
+                    return self._send(200, view)
+
+                if self.path.endswith("/batches"):
+                    body = json.loads(self._body())
+                    if body.get("input_file_id") not in mock.files:
+                        return self._send(404, {"error": {"message": "No such file"}})
+                    lines = mock.files[body["input_file_id"]].splitlines()
+                    tokens = sum(estimate_tokens(json.loads(line)["body"]["messages"]) for line in lines)
+                    batch_id = mock._new_id("batch")
+                    with mock.lock:
+                        draw = mock.random.random()
+                        mock.outcomes[batch_id] = (
+                            "failed" if draw < mock.batch_fail_rate else
+                            "expired" if draw < mock.batch_fail_rate + mock.batch_expire_rate else "completed"
+                        )
+                        mock.batches[batch_id] = {
+                            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+                            "input_file_id": body["input_file_id"], "status": "in_progress",
+                            "created_at": time.time(), "output_file_id": None, "error_file_id": None,
+                            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+                        }
+                    mock._count(batches_created=1, batch_requests=len(lines), batch_prompt_tokens=tokens)
+                    return self._send(200, mock._batch_view(mock.batches[batch_id]))
+
+                self._send(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+            def do_GET(self):
+                parts = self.path.rstrip('/').split('/')
+                if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in mock.batches:
+                    return self._send(200, mock._batch_view(mock.batches[parts[-1]]))
+                if parts[-1] == "content" and parts[-2] in mock.files:
+                    return self._send(200, raw=mock.files[parts[-2]])
+                self._send(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every chat request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of chat requests answered with 429")
+    parser.add_argument("--batch-delay", type=float, default=5.0, help="seconds before a batch completes")
+    parser.add_argument("--batch-error-rate", type=float, default=0.0, help="fraction of batch requests that fail")
+    parser.add_argument("--batch-expire-rate", type=float, default=0.0, help="fraction of batches that expire half done")
+    parser.add_argument("--batch-fail-rate", type=float, default=0.0, help="fraction of batches that fail outright")
+    args = parser.parse_args()
+
+    mock = MockOpenAI(port=args.port, latency=args.latency, error_rate=args.error_rate, batch_delay=args.batch_delay,
+                      batch_error_rate=args.batch_error_rate, batch_expire_rate=args.batch_expire_rate,
+                      batch_fail_rate=args.batch_fail_rate)
+    print(f"Mock OpenAI API listening on {mock.base_url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(mock.stats, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Generate a folder of synthetic research-paper PDFs for benchmarks.
+
+The PDFs are written by hand (no PDF library needed): page 0 carries a large-font title,
+an author line, a year and a DOI, and every page is filled with sentences of filler text.
+
+    python benchmarks/synthetic_corpus.py ./corpus --papers 300 --pages 12
+"""
+import argparse
+import os
+import random
+
+WORDS = (
+    "innovation patent firm data growth market policy research effect model results evidence "
+    "estimate sample regression variable productivity investment technology diffusion spillover "
+    "endogeneity instrument panel survey citation industry entry exit competition subsidy"
+).split()
+SURNAMES = "Smith Chen Garcia Novak Okafor Tanaka Rossi Muller Silva Kim Haddad Larsen".split()
+
+LINES_PER_PAGE = 48
+WORDS_PER_LINE = 12
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+    return words[0].capitalize() + ' ' + ' '.join(words[1:]) + '.'
+
+
+def paper_pages(rng, index, pages):
+    """Return (title, authors, year, page_lines) for one synthetic paper."""
+    title = f"{rng.choice(WORDS).capitalize()} and {rng.choice(WORDS)}: evidence from paper {index}"
+    authors = ', '.join(f"{chr(65 + rng.randint(0, 25))}. {rng.choice(SURNAMES)}" for _ in range(rng.randint(1, 4)))
+    year = rng.randint(1995, 2024)
+
+    page_lines = []
+    for page in range(pages):
+        words = ' '.join(_sentence(rng) for _ in range(LINES_PER_PAGE)).split()
+        lines = [' '.join(words[i:i + WORDS_PER_LINE]) for i in range(0, len(words), WORDS_PER_LINE)]
+        page_lines.append(lines[:LINES_PER_PAGE - (6 if page == 0 else 0)])
+    return title, authors, year, page_lines
+
+
+def write_pdf(path, title, authors, year, page_lines, doi):
+    """Write a minimal, valid multi-page PDF with Helvetica text and an Info dictionary."""
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        4: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>",
+        5: f"<< /Title ({_escape(title)}) /Author ({_escape(authors)}) /CreationDate (D:{year}0101000000) >>".encode('latin-1'),
+    }
+    kids = []
+    next_id = 6
+    for page, lines in enumerate(page_lines):
+        ops = []
+        y = 740
+        if page == 0:
+            ops.append(f"BT /F2 18 Tf 72 {y} Td ({_escape(title)}) Tj ET")
+            ops.append(f"BT /F1 11 Tf 72 {y - 24} Td ({_escape(authors)}) Tj ET")
+            ops.append(f"BT /F1 9 Tf 72 {y - 40} Td (Published {year}. doi:{_escape(doi)}) Tj ET")
+            y -= 70
+        for line in lines:
+            ops.append(f"BT /F1 10 Tf 72 {y} Td ({_escape(line)}) Tj ET")
+            y -= 14
+        stream = '\n'.join(ops).encode('latin-1')
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        kids.append(page_id)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b' '.join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += b"%d 0 obj\n" % obj_id + objects[obj_id] + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % next_id
+    for obj_id in range(1, next_id):
+        out += b"%010d 00000 n \n" % offsets[obj_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_id, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def generate_corpus(folder, papers, pages, seed=0):
+    """Write `papers` PDFs of `pages` pages each into folder; returns their paths."""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for index in range(papers):
+        title, authors, year, page_lines = paper_pages(rng, index, pages)
+        path = os.path.join(folder, f"paper_{index:05d}.pdf")
+        write_pdf(path, title, authors, year, page_lines, doi=f"10.5555/synthetic.{year}.{index:05d}")
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder")
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = generate_corpus(args.folder, args.papers, args.pages, args.seed)
+    print(f"Wrote {len(paths)} PDFs to {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,57 @@
-import pandas as pd
-import datetime, os, re, json
+import datetime, os, re, json, hashlib
 from datetime import datetime
 from openai import OpenAI
 from PyPDF2 import PdfReader
 from pdfminer.high_level import extract_text
+from litsummarizer_cache import ExtractionCache, ResponseCache, atomic_write_json, file_digest, summary_field
+from litsummarizer_async import run_completions
+from litsummarizer_extract import EXTRACTOR_NAME, EXTRACTOR_VERSION, extract_many
+from litsummarizer_dedup import DEDUP_FIELD, DuplicateIndex, text_signature
+from litsummarizer_metadata import LOCAL_METADATA_FIELD, extract_local_metadata, extract_pages_and_metadata
+from litsummarizer_chunking import chunk_text, get_tokenizer, reduce_prompt
+from litsummarizer_index import PaperIndex, passages
+from litsummarizer_history import HistoryStore
+from litsummarizer_telemetry import telemetry
+from litsummarizer_text import clean_text, clean_text_for_excel
+from litsummarizer_output import output_paths_for, write_rows
 
 client = OpenAI(
     api_key=os.environ.get("OPENAI_API_KEY")
 )
 
-def clean_text_for_excel(text):
-    if text is None:
-        return ""
+# Extracted text, metadata and summaries are cached by PDF content hash across questions and runs
+cache = ExtractionCache(extractor=EXTRACTOR_NAME, version=EXTRACTOR_VERSION)
+# Every chat completion is also cached by its exact request, so identical requests are only paid for once
+response_cache = ResponseCache()
 
-    if not isinstance(text, str):
-        text = str(text)
-    
-    text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', text)
-    text = text.replace('“', '"').replace('”', '"') 
-    text = text.replace('’', "'").replace('‘', "'")  
-    text = text.replace('–', '-')  
-    text = text.replace('—', '-')  
-    
-    return text
+SUMMARY_SYSTEM_PROMPT = "You are an expert assistant. Please provide concise and informative responses. Each response should be no longer than 2-3 sentences."
+
+parameters = {
+    "RQ": "What is the research question of the paper?",
+    "Main Findings": "What are the main findings of the paper?",
+    "Contributions": "What are the main contributions of the paper?",
+    "Data": "What data does the paper use?",
+    "Methods": "What method does it use and is there any issue with endogeneity?",
+    "Key Variables": "What are the key variables of the paper?",
+    "Limitation and Future Directions": "What are the limitations of the paper and what could future research look like?"
+}
+
+UNKNOWN_METADATA = ("Unknown Title", "Unknown Authors", "Unknown Year")
+
+OUTPUT_COLUMNS = ["Index", "Paper Name", "Paper Authors", "Publication Year", *parameters]
+
+# "per_prompt" sends one request per entry in `parameters`; "structured" asks them all (plus the
+# metadata) in a single JSON-schema request per paper, sending the paper text once instead of 8 times
+SUMMARY_MODE = os.environ.get("LITSUMMARIZER_SUMMARY_MODE", "per_prompt")
 
+# Papers longer than this are summarized chunk by chunk and the answers merged (map-reduce)
+MAX_PAPER_TOKENS = 100000
+CHUNK_OVERLAP_TOKENS = 500
+
+# How much retrieved paper context and chat history each question may carry
+TOP_K_PAPERS = 12
+CONTEXT_TOKEN_BUDGET = 24000
+HISTORY_TOKEN_BUDGET = 4000
 
 # def extract_metadata(file_path: str) -> dict:
 #     from pdfminer.pdfparser import PDFParser
@@ -41,10 +69,6 @@ def clean_text_for_excel(text):
 #         print(f"Metadata extraction failed: {e}")
 #     return metadata
 
-def clean_text(text):
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
 def extract_text_from_pdfs(folder_path):
     texts = []
     for filename in os.listdir(folder_path):
@@ -65,86 +89,379 @@ def extract_text_first_page(file_path):
         print(f"Text extraction failed: {e}")
         return ""
 
-def ask_chatgpt_for_metadata(text):
-    try:
-        prompt = (
-            "You are an expert in academic papers. Given the following text from the first page of a PDF, "
-            "identify the title of the paper, the authors, and the publication year:\n\n"
-            f"{text}\n\n"
-            "Please respond with the title followed by 'Title:', the authors followed by 'Authors:', and the year "
-            "formatted as 'Year: YYYY'."
-        )
+def metadata_request(text):
+    """Build the chat completion request asking for a paper's title, authors and year."""
+    prompt = (
+        "You are an expert in academic papers. Given the following text from the first page of a PDF, "
+        "identify the title of the paper, the authors, and the publication year:\n\n"
+        f"{text}\n\n"
+        "Please respond with the title followed by 'Title:', the authors followed by 'Authors:', and the year "
+        "formatted as 'Year: YYYY'."
+    )
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are an expert in academic paper analysis."},
+            {"role": "user", "content": prompt}
+        ]
+    }
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert in academic paper analysis."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        response_text = response.choices[0].message.content
-        
-        title_match = re.search(r'Title:\s*(.+)', response_text)
-        authors_match = re.search(r'Authors:\s*(.+)', response_text)
-        year_match = re.search(r'Year:\s*(\d{4})', response_text)
+def parse_metadata_response(response_text):
+    title_match = re.search(r'Title:\s*(.+)', response_text)
+    authors_match = re.search(r'Authors:\s*(.+)', response_text)
+    year_match = re.search(r'Year:\s*(\d{4})', response_text)
 
-        title = title_match.group(1).strip() if title_match else "Unknown Title"
-        authors = authors_match.group(1).strip() if authors_match else "Unknown Authors"
-        year = int(year_match.group(1).strip()) if year_match else "Unknown Year"
+    title = title_match.group(1).strip() if title_match else "Unknown Title"
+    authors = authors_match.group(1).strip() if authors_match else "Unknown Authors"
+    year = int(year_match.group(1).strip()) if year_match else "Unknown Year"
 
-        return title, authors, year
+    return title, authors, year
+
+def ask_chatgpt_for_metadata(text):
+    try:
+        response = response_cache.create(client, metadata_request(text), stage="metadata")
+        return parse_metadata_response(response.choices[0].message.content)
 
     except Exception as e:
         print(f"Error asking ChatGPT for metadata: {e}")
-        return "Unknown Title", "Unknown Authors", "Unknown Year"
+        return UNKNOWN_METADATA
 
-def process_paper(file_path):
+def local_paper_metadata(file_path, doc_key):
+    """Title, authors and year read from the PDF itself (Info dictionary, page 0 layout, DOI/arXiv ID)."""
+    metadata = cache.get(doc_key, LOCAL_METADATA_FIELD)
+    if metadata is None:
+        try:
+            metadata = extract_local_metadata(file_path)
+        except Exception as e:
+            print(f"Local metadata extraction failed for {os.path.basename(file_path)}: {e}")
+            return None
+        cache.put(doc_key, LOCAL_METADATA_FIELD, metadata)
+    return metadata
+
+def metadata_requests(papers):
+    """Split [(file_path, doc_key), ...] into metadata already known and the requests still needed.
+
+    Returns (results, requests): (title, authors, year) or None per paper, and {i: request} for
+    papers whose metadata is neither cached nor read confidently from the PDF itself.
+    """
+    results = [None] * len(papers)
+    requests = {}
+    for i, (file_path, doc_key) in enumerate(papers):
+        metadata = cache.get(doc_key, "metadata")
+        if metadata is not None:
+            results[i] = tuple(metadata)
+            continue
+        local = local_paper_metadata(file_path, doc_key)
+        if local and local["confident"]:
+            results[i] = (local["title"], local["authors"], local["year"])
+            cache.put(doc_key, "metadata", list(results[i]))
+            continue
+        text = cache.get(doc_key, "first_page")
+        if text is None:
+            text = extract_text_first_page(file_path)
+            if text:
+                cache.put(doc_key, "first_page", text)
+        requests[i] = metadata_request(text)
+    return results, requests
+
+def fetch_metadata(papers):
+    """Look up title, authors and year for [(file_path, doc_key), ...], reusing cached lookups.
+
+    Papers whose metadata can be read confidently from the PDF itself skip the model; the rest
+    are asked for concurrently.
+    """
+    results, requests = metadata_requests(papers)
+    if requests and len(requests) < len(papers):
+        print(f"Metadata: {len(papers) - len(requests)} papers resolved locally or from cache, "
+              f"asking the model for {len(requests)}")
+    labels = {i: {"paper": os.path.basename(papers[i][0])} for i in requests}
+    for i, response in run_completions(requests, stage="metadata", labels=labels, cache=response_cache).items():
+        if isinstance(response, Exception):
+            print(f"Error asking ChatGPT for metadata: {response}")
+            results[i] = UNKNOWN_METADATA
+            continue
+        results[i] = parse_metadata_response(response.choices[0].message.content)
+        # Don't pin a failed lookup in the cache; retry it on the next run
+        if results[i] != UNKNOWN_METADATA:
+            cache.put(papers[i][1], "metadata", list(results[i]))
+
+    return [format_metadata(title, authors, year) for title, authors, year in results]
+
+def format_metadata(title, authors, year):
+    return title, f"{authors} ({year})", year
+
+def incomplete_record(record):
+    """Whether a record's metadata lookup or any of its answers failed, so the paper is asked again next run."""
+    metadata_failed = (record["Paper Name"], record["Publication Year"]) == (UNKNOWN_METADATA[0], UNKNOWN_METADATA[2])
+    # Failed answers are stored as empty cells
+    return metadata_failed or any(record.get(key) == "" for key in parameters)
+
+def process_paper(file_path, doc_key=None):
     """Process the PDF to extract title, authors, and publication year using ChatGPT."""
-    text = extract_text_first_page(file_path)
-    
-    title, authors, year = ask_chatgpt_for_metadata(text)
-    formatted_authors = f"{authors} ({year})"
+    return fetch_metadata([(file_path, doc_key)])[0]
+
+def paper_signature(doc_key, text=None):
+    """Cached text_signature() of a paper, or None if its text isn't available."""
+    signature = cache.get(doc_key, DEDUP_FIELD)
+    if signature is None:
+        text = cache.get(doc_key, "full_text") if text is None else text
+        if text is None:
+            return None
+        signature = text_signature(text)
+        cache.put(doc_key, DEDUP_FIELD, signature)
+    return signature
+
+def find_duplicates(papers, known=None):
+    """Map each of `papers` [(i, file_path, doc_key, text), ...] that repeats another paper onto it.
+
+    `known` ({pdf_file: (doc_key, record)}) are papers summarized in earlier runs; they are
+    indexed first, then `papers` in order. Returns {i: (pdf_file of a known paper or the i of an
+    earlier one, similarity)}.
+    """
+    index = DuplicateIndex()
+    for pdf_file, (doc_key, _) in sorted((known or {}).items()):
+        signature = paper_signature(doc_key)
+        if signature is not None:
+            index.add(pdf_file, signature)
+    duplicates = {}
+    for i, _, doc_key, text in papers:
+        match = index.add(i, paper_signature(doc_key, text))
+        if match is not None:
+            duplicates[i] = match
+    return duplicates
+
+def extract_documents(documents):
+    """Return {doc_key: cleaned full text} for [(file_path, doc_key), ...]; None where extraction failed.
+
+    Every uncached PDF is parsed once, in parallel, and the same parse yields page 0's layout
+    metadata. Text, first page and metadata are stored in the cache.
+    """
+    for file_path, doc_key in documents:
+        telemetry.name_paper(doc_key, os.path.basename(file_path))
+    texts = {doc_key: cache.get(doc_key, "full_text") for _, doc_key in documents}
+    to_extract = {file_path: doc_key for file_path, doc_key in documents if texts[doc_key] is None}
+    extracted = extract_many(list(to_extract), extractor=extract_pages_and_metadata)
+    for done, (file_path, payload, error) in enumerate(extracted, start=1):
+        print(f"Extracted file {done}/{len(to_extract)}: {os.path.basename(file_path)}")
+        if error is not None:
+            print(f"Failed to extract text from {os.path.basename(file_path)}: {error}")
+            continue
+        doc_key = to_extract[file_path]
+        pages, local = payload["pages"], payload["metadata"]
+        texts[doc_key] = clean_text("\n".join(pages))
+        cache.put(doc_key, "full_text", texts[doc_key])
+        if pages:
+            cache.put(doc_key, "first_page", pages[0])
+        cache.put(doc_key, LOCAL_METADATA_FIELD, local)
+        # Confident local metadata also keeps the structured request from asking for it
+        if local["confident"] and cache.get(doc_key, "metadata") is None:
+            cache.put(doc_key, "metadata", [local["title"], local["authors"], local["year"]])
+    return texts
 
-    return title, formatted_authors, year
+def prepare_papers(documents, known=None):
+    """Extract [(file_path, doc_key), ...] and set aside duplicates.
+
+    Returns (papers, duplicates): [(i, file_path, doc_key, text)] for the documents to summarize,
+    and find_duplicates()'s {i: (original, similarity)} for the copies.
+    """
+    texts = extract_documents(documents)
+
+    papers = [(i, file_path, doc_key, texts[doc_key])
+              for i, (file_path, doc_key) in enumerate(documents) if texts[doc_key] is not None]
+
+    # Identical and near-identical copies (same PDF twice, preprint and published version) are
+    # collapsed onto one paper before anything is sent to the model
+    with telemetry.span("dedup"):
+        duplicates = find_duplicates(papers, known)
+    if duplicates:
+        print(f"Skipping {len(duplicates)} duplicate papers.")
+        papers = [paper for paper in papers if paper[0] not in duplicates]
+    return papers, duplicates
+
+def plan_documents(documents, known=None):
+    """The requests summarize_documents() would send for `documents`, without sending any.
+
+    Returns {key: request} for the metadata and summary (or structured) requests. Requests that
+    depend on other answers (chunk reduction, structured fallbacks) are not included; once the
+    planned ones are in the response cache, summarize_documents() only sends those.
+    """
+    papers, _ = prepare_papers(documents, known)
+    texts = [(text, doc_key) for _, _, doc_key, text in papers]
+    plan = {}
+    if SUMMARY_MODE == "structured":
+        _, missing, _, structured = _structured_requests(texts, with_metadata=True)
+        plan.update({("structured_summary", i): request for i, (request, _) in structured.items()})
+        # Papers too long for one structured request are summarized prompt by prompt instead
+        unplanned = [i for i in range(len(papers)) if i not in structured]
+    else:
+        _, missing = _cached_summaries(texts)
+        unplanned = list(range(len(papers)))
+
+    _, metadata = metadata_requests([(papers[i][1], papers[i][2]) for i in unplanned])
+    plan.update({("metadata", unplanned[i]): request for i, request in metadata.items()})
+    _, summary = _map_requests(texts, [(i, key) for i in unplanned for key in missing[i]])
+    plan.update({("summary", *key): request for key, request in summary.items()})
+    return plan
+
+def summarize_documents(documents, known=None):
+    """Extract, look up metadata for and summarize [(file_path, doc_key), ...].
+
+    Copies of the same paper, within `documents` or among `known` ones ({pdf_file: (doc_key,
+    record)}), are summarized once and share the record. Returns one record (without "Index")
+    per document, or None where extraction failed.
+    """
+    papers, duplicates = prepare_papers(documents, known)
+
+    # Each phase sends the whole folder's requests concurrently, one phase after the other:
+    # metadata, then the per-chunk summaries, then the merges of multi-chunk answers
+    print(f"Summarizing {len(papers)} papers...")
+    if SUMMARY_MODE == "structured":
+        summaries, metadata = summarize_papers_structured(
+            [(text, doc_key) for _, _, doc_key, text in papers], with_metadata=True
+        )
+        # Papers whose structured answer had no usable metadata get the dedicated metadata prompt
+        unresolved = [i for i, paper_metadata in enumerate(metadata) if paper_metadata is None]
+        fallback = dict(zip(unresolved, fetch_metadata([(papers[i][1], papers[i][2]) for i in unresolved])))
+        metadata = [
+            fallback[i] if paper_metadata is None else format_metadata(*paper_metadata)
+            for i, paper_metadata in enumerate(metadata)
+        ]
+    else:
+        metadata = fetch_metadata([(file_path, doc_key) for _, file_path, doc_key, _ in papers])
+        summaries = summarize_papers([(text, doc_key) for _, _, doc_key, text in papers])
+
+    records = [None] * len(documents)
+    for (i, _, _, _), (title, authors, year), paper_summaries in zip(papers, metadata, summaries):
+        records[i] = {
+            "Paper Name": title,
+            "Paper Authors": authors,
+            "Publication Year": year,
+            **paper_summaries
+        }
+    for i, (original, score) in duplicates.items():
+        if isinstance(original, str):
+            name, record = original, known[original][1]
+        else:
+            name, record = os.path.basename(documents[original][0]), records[original]
+        print(f"{os.path.basename(documents[i][0])} duplicates {name} ({score:.0%} similar); reusing its summary.")
+        records[i] = dict(record)
+    return records
+
+def manifest_path_for(output_filename):
+    return f"{os.path.splitext(output_filename)[0]}.manifest.json"
+
+def load_manifest(file_path):
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as file:
+            return json.load(file)
+    return {"prompts": None, "files": {}}
+
+def save_manifest(file_path, manifest):
+    atomic_write_json(file_path, manifest, indent=4)
+
+def prompt_fingerprint():
+    """Changes whenever the prompts change, so stale rows are never merged into the output."""
+    return hashlib.sha256(json.dumps([SUMMARY_SYSTEM_PROMPT, parameters]).encode('utf-8')).hexdigest()
+
+def current_manifest(output_filename):
+    """Return (manifest path, manifest) for output_filename, starting over if the prompts have changed."""
+    manifest_path = manifest_path_for(output_filename)
+    manifest = load_manifest(manifest_path)
+    if manifest["prompts"] != prompt_fingerprint():
+        manifest = {"prompts": prompt_fingerprint(), "files": {}}
+    return manifest_path, manifest
+
+def use_prompt_set(prompt_set):
+    """Summarize with a prompt set from load_prompt_set() instead of the built-in `parameters`."""
+    global parameters, SUMMARY_SYSTEM_PROMPT, OUTPUT_COLUMNS
+    parameters = dict(prompt_set["questions"])
+    if prompt_set.get("system"):
+        SUMMARY_SYSTEM_PROMPT = prompt_set["system"]
+    OUTPUT_COLUMNS = ["Index", "Paper Name", "Paper Authors", "Publication Year", *parameters]
+
+def scan_folder(folder_path, manifest):
+    """Compare a folder's PDFs with a manifest.
+
+    Returns (pdf_files, entries, changed, removed): all PDF names in order, the manifest entries
+    of unchanged PDFs, [(pdf_file, file_path, digest, stat)] for new or modified ones, and the
+    names of PDFs that are gone. Unchanged PDFs are recognised by size and mtime without being read.
+    PDFs whose row is marked incomplete (a request failed) count as modified, so they are retried.
+    """
+    pdf_files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith('.pdf'))
+    entries = {}
+    changed = []
+    for pdf_file in pdf_files:
+        file_path = os.path.join(folder_path, pdf_file)
+        stat = os.stat(file_path)
+        entry = manifest["files"].get(pdf_file)
+        if entry is None or entry.get("incomplete") or (entry["size"], entry["mtime"]) != (stat.st_size, stat.st_mtime):
+            digest = file_digest(file_path)
+            if entry is None or entry.get("incomplete") or entry["hash"] != digest:
+                changed.append((pdf_file, file_path, digest, stat))
+                continue
+            # Touched but identical content: keep the row, remember the new mtime
+            entry = dict(entry, size=stat.st_size, mtime=stat.st_mtime)
+        entries[pdf_file] = entry
+    removed = set(manifest["files"]) - set(pdf_files)
+    return pdf_files, entries, changed, removed
+
+def write_summary(pdf_files, entries, output_filename):
+    """Stream the rows of `entries` ({pdf_file: manifest entry}) to the workbook (and any extra formats) in pdf_files order."""
+    rows = (
+        {"Index": idx, **entries[pdf_file]["record"]}
+        for idx, pdf_file in enumerate((f for f in pdf_files if f in entries), start=1)
+    )
+    with telemetry.span("write", output=output_filename):
+        return write_rows(rows, output_paths_for(output_filename), columns=OUTPUT_COLUMNS)
 
 def process_folder(folder_path, output_filename):
-    data_records = []
+    """Summarize a folder into output_filename, reprocessing only PDFs added or changed since the last run.
+
+    A manifest next to the output (path, size, mtime, content hash -> row) records what each row
+    was built from; unchanged PDFs are recognised by size and mtime without being read.
+    """
     folder_summary = {}
-    pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
-    
+    manifest_path, manifest = current_manifest(output_filename)
+    pdf_files, entries, changed, removed = scan_folder(folder_path, manifest)
     if not pdf_files:
         print("No PDF files found in the specified folder.")
         return
-    
-    for idx, pdf_file in enumerate(pdf_files, start=1):
-        print(f"Processing file {idx}/{len(pdf_files)}: {pdf_file}")
-        file_path = os.path.join(folder_path, pdf_file)
-        
-        title, authors, year = process_paper(file_path)
-        try:
-            full_text = extract_text(file_path)
-            full_text_clean = clean_text(full_text)
-        except Exception as e:
-            print(f"Failed to extract text from {pdf_file}: {e}")
-            continue 
-        
-        summaries = summarize_paper(full_text_clean)
-        
-        record = {
-            "Index": idx,
-            "Paper Name": title,
-            "Paper Authors": authors,
-            "Publication Year": year,
-            **summaries
-        }
-        data_records.append(record)
-        folder_summary[title] = summaries
-    
-    # Create DataFrame and save to Excel
-    df = pd.DataFrame(data_records)
-    df.to_excel(output_filename, index=False)
-    print(f"\nAll papers processed. Summary saved to '{output_filename}'.")
+
+    print(f"{len(changed)} new or modified, {len(removed)} removed, {len(entries)} unchanged PDFs.")
+
+    if changed:
+        known = {pdf_file: (cache.digest_key(entry["hash"]), entry["record"]) for pdf_file, entry in entries.items()}
+        records = summarize_documents(
+            [(file_path, cache.digest_key(digest)) for _, file_path, digest, _ in changed], known
+        )
+        incomplete = 0
+        for (pdf_file, _, digest, stat), record in zip(changed, records):
+            if record is not None:
+                entries[pdf_file] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": digest, "record": record}
+                if incomplete_record(record):
+                    # Keep the row for now, but ask again on the next run
+                    entries[pdf_file]["incomplete"] = True
+                    incomplete += 1
+        if incomplete:
+            print(f"{incomplete} papers have failed answers or metadata; they will be retried on the next run.")
+
+    for pdf_file in pdf_files:
+        if pdf_file in entries:
+            record = entries[pdf_file]["record"]
+            folder_summary[record["Paper Name"]] = {key: record[key] for key in parameters}
+
+    if changed or removed or not os.path.exists(output_filename):
+        # Stream the rows to the workbook (and any extra formats) without building a DataFrame
+        write_summary(pdf_files, entries, output_filename)
+        print(f"\nAll papers processed. Summary saved to '{output_filename}'.")
+    else:
+        print(f"\nNo changes. Summary in '{output_filename}' is up to date.")
+
+    manifest["files"] = entries
+    save_manifest(manifest_path, manifest)
+    if changed:
+        telemetry.finish(f"Run summary for '{output_filename}'")
+        print(response_cache.stats())
 
     return folder_summary
 
@@ -188,28 +505,213 @@ def create_comprehensive_review(folder_summary, broad_topic):
     
     return review
         
-def summarize_paper(text):
-    parameters = {
-        "RQ": "What is the research question of the paper?",
-        "Main Findings": "What are the main findings of the paper?",
-        "Contributions": "What are the main contributions of the paper?",
-        "Data": "What data does the paper use?",
-        "Methods": "What method does it use and is there any issue with endogeneity?",
-        "Key Variables": "What are the key variables of the paper?",
-        "Limitation and Future Directions": "What are the limitations of the paper and what could future research look like?"
+def summary_request(prompt, text):
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": f"{prompt}\n\n{text}"}
+        ]
+    }
+
+def reduce_request(prompt, chunk_answers):
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": reduce_prompt(prompt, chunk_answers)}
+        ]
+    }
+
+def structured_summary_request(text, keys, with_metadata=False):
+    """Build one request that answers every prompt in `keys` (and optionally the metadata) as a JSON object."""
+    properties = {key: {"type": "string", "description": parameters[key]} for key in keys}
+    if with_metadata:
+        properties["title"] = {"type": "string", "description": "The title of the paper."}
+        properties["authors"] = {"type": "string", "description": "The authors of the paper, comma separated."}
+        properties["year"] = {"type": ["integer", "null"], "description": "The publication year, or null if unknown."}
+
+    questions = "\n".join(f"- {key}: {parameters[key]}" for key in keys)
+    prompt = (
+        "Answer each of the following questions about the paper below. Reply with a JSON object that has one "
+        "field per question" + (", plus the paper's title, authors and publication year" if with_metadata else "") +
+        f".\n\n{questions}\n\n{text}"
+    )
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "paper_summary",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": list(properties),
+                    "additionalProperties": False
+                }
+            }
+        }
+    }
+
+def parse_structured_summary(response_text, keys, with_metadata=False):
+    """Return (answers, metadata) keeping only the fields that validate; metadata is None when unusable."""
+    try:
+        data = json.loads(response_text)
+    except (TypeError, ValueError):
+        return {}, None
+    if not isinstance(data, dict):
+        return {}, None
+
+    answers = {
+        key: clean_text_for_excel(data[key])
+        for key in keys if isinstance(data.get(key), str) and data[key].strip()
+    }
+
+    metadata = None
+    if with_metadata:
+        title, authors, year = data.get("title"), data.get("authors"), data.get("year")
+        if (isinstance(title, str) and title.strip() and isinstance(authors, str) and authors.strip()
+                and isinstance(year, int) and 1000 <= year <= 2100):
+            metadata = (title.strip(), authors.strip(), year)
+    return answers, metadata
+
+def paper_chunks(text):
+    """Split a paper into chunks that fit the model's context, overlapping at the cuts."""
+    return chunk_text(text, MAX_PAPER_TOKENS, CHUNK_OVERLAP_TOKENS)
+
+def _map_requests(papers, wanted):
+    """Chunks per paper and {(paper index, key, chunk): request} for each (paper index, key) in `wanted`."""
+    chunks = {i: paper_chunks(papers[i][0]) for i in {i for i, _ in wanted}}
+    requests = {
+        (i, key, c): summary_request(parameters[key], chunk)
+        for i, key in wanted for c, chunk in enumerate(chunks[i])
     }
-    summaries = {}
-    for key, prompt in parameters.items():
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert assistant. Please provide concise and informative responses. Each response should be no longer than 2-3 sentences."},
-                {"role": "user", "content": f"{prompt}\n\n{text}"}
-            ]
+    return chunks, requests
+
+def _summarize_per_prompt(papers, summaries, wanted):
+    """Answer each (paper index, key) in `wanted` with its own prompt.
+
+    Papers longer than MAX_PAPER_TOKENS are mapped chunk by chunk and the per-chunk answers
+    reduced into one with a final request.
+    """
+    chunks, requests = _map_requests(papers, wanted)
+    responses = run_completions(requests, stage="summary", cache=response_cache, labels={
+        (i, key, c): {"paper": telemetry.paper_name(papers[i][1]), "prompt": key, "chunk": c} for i, key, c in requests
+    })
+
+    answers = {}
+    reduce_requests = {}
+    for i, key in wanted:
+        chunk_answers = [responses[(i, key, c)] for c in range(len(chunks[i]))]
+        errors = [answer for answer in chunk_answers if isinstance(answer, Exception)]
+        if errors or not chunk_answers:
+            answers[(i, key)] = errors[0] if errors else ValueError("paper has no text")
+        elif len(chunk_answers) == 1:
+            answers[(i, key)] = chunk_answers[0].choices[0].message.content
+        else:
+            texts = [answer.choices[0].message.content for answer in chunk_answers]
+            reduce_requests[(i, key)] = reduce_request(parameters[key], texts)
+    reduce_labels = {(i, key): {"paper": telemetry.paper_name(papers[i][1]), "prompt": key} for i, key in reduce_requests}
+    for (i, key), response in run_completions(reduce_requests, stage="reduce", labels=reduce_labels, cache=response_cache).items():
+        answers[(i, key)] = response if isinstance(response, Exception) else response.choices[0].message.content
+
+    for (i, key), summary_text in answers.items():
+        if isinstance(summary_text, Exception):
+            print(f"Error summarizing '{key}': {summary_text}")
+            summaries[i][key] = ""
+            continue
+        summaries[i][key] = clean_text_for_excel(summary_text)  # Clean the summary text before saving
+        field = summary_field("gpt-4o-mini", SUMMARY_SYSTEM_PROMPT, parameters[key])
+        cache.put(papers[i][1], field, summaries[i][key])
+
+def _cached_summaries(papers):
+    """Split into cached answers per paper and the prompt keys still missing per paper."""
+    summaries = [{} for _ in papers]
+    missing = [[] for _ in papers]
+    for i, (text, doc_key) in enumerate(papers):
+        for key, prompt in parameters.items():
+            cached_summary = cache.get(doc_key, summary_field("gpt-4o-mini", SUMMARY_SYSTEM_PROMPT, prompt))
+            if cached_summary is not None:
+                summaries[i][key] = cached_summary
+            else:
+                missing[i].append(key)
+    return summaries, missing
+
+def _structured_requests(papers, with_metadata=False):
+    """Cached answers and {paper index: (request, asks for metadata)} for the structured path.
+
+    Returns (summaries, missing, metadata, requests) as used by summarize_papers_structured().
+    """
+    summaries, missing = _cached_summaries(papers)
+    metadata = [None] * len(papers)
+    requests = {}
+    for i, (text, doc_key) in enumerate(papers):
+        # Papers too long for one request are map-reduced prompt by prompt below
+        if len(paper_chunks(text)) > 1:
+            continue
+        wants_metadata = False
+        if with_metadata:
+            cached_metadata = cache.get(doc_key, "metadata")
+            if cached_metadata is not None:
+                metadata[i] = tuple(cached_metadata)
+            else:
+                wants_metadata = True
+        if missing[i] or wants_metadata:
+            requests[i] = (structured_summary_request(text, missing[i], wants_metadata), wants_metadata)
+    return summaries, missing, metadata, requests
+
+def summarize_papers_structured(papers, with_metadata=False):
+    """Summarize [(text, doc_key), ...] with a single structured request per paper.
+
+    Returns (summaries, metadata): one summaries dict per paper, and one (title, authors, year)
+    tuple or None per paper. Fields the model leaves out or gets wrong fall back to the
+    one-prompt-per-request path; missing metadata is left to the caller.
+    """
+    summaries, missing, metadata, requests = _structured_requests(papers, with_metadata)
+    responses = run_completions(
+        {i: request for i, (request, _) in requests.items()}, stage="structured_summary",
+        labels={i: {"paper": telemetry.paper_name(papers[i][1])} for i in requests}, cache=response_cache
+    )
+    for i, response in responses.items():
+        if isinstance(response, Exception):
+            print(f"Error requesting structured summary: {response}")
+            continue
+        answers, paper_metadata = parse_structured_summary(
+            response.choices[0].message.content, missing[i], requests[i][1]
         )
-        summary_text = response.choices[0].message.content
-        summaries[key] = clean_text_for_excel(summary_text)  # Clean the summary text before saving
-    return summaries
+        for key, answer in answers.items():
+            summaries[i][key] = answer
+            cache.put(papers[i][1], summary_field("gpt-4o-mini", SUMMARY_SYSTEM_PROMPT, parameters[key]), answer)
+        if paper_metadata is not None:
+            metadata[i] = paper_metadata
+            cache.put(papers[i][1], "metadata", list(paper_metadata))
+
+    fallback = [(i, key) for i in range(len(papers)) for key in missing[i] if key not in summaries[i]]
+    if fallback:
+        print(f"Falling back to individual prompts for {len(fallback)} answers.")
+    _summarize_per_prompt(papers, summaries, fallback)
+
+    summaries = [{key: paper_summaries[key] for key in parameters} for paper_summaries in summaries]
+    return summaries, metadata
+
+def summarize_papers(papers):
+    """Summarize [(text, doc_key), ...] with every prompt in `parameters`, fanning requests out concurrently."""
+    if SUMMARY_MODE == "structured":
+        return summarize_papers_structured(papers)[0]
+
+    summaries, missing = _cached_summaries(papers)
+    _summarize_per_prompt(papers, summaries, [(i, key) for i in range(len(papers)) for key in missing[i]])
+
+    # Keep the column order of `parameters` regardless of which answers came from the cache
+    return [{key: paper_summaries[key] for key in parameters} for paper_summaries in summaries]
+
+def summarize_paper(text, doc_key=None):
+    return summarize_papers([(text, doc_key)])[0]
 
 # def summarize_folder(folder_path):
 #     texts = extract_text_from_pdfs(folder_path)
@@ -222,33 +724,30 @@ def summarize_paper(text):
 #     return folder_summary
 
 def ask_chatgpt(question,context):
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
+    response = response_cache.create(client, {
+        "model": "gpt-4o-mini",
         # The system message is optional and can be used to set the behavior of the assistant
         # The user messages provide requests or comments for the assistant to respond to
         # Assistant messages store previous assistant responses, but can also be written by you to give examples of desired behavior 
-        messages=[
+        "messages": [
             {"role": "system", "content": "You are an expert assistant, skilled in comparing research topics."},
             {"role": "user", "content": f"{context}\n\n{question}"}
         ]
-    )
+    }, stage="answer")
     return response.choices[0].message.content
 
-def load_history(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as file:
-            return json.load(file)
-    return {"questions": [], "answers": []}
+def history_store(file_path):
+    """HistoryStore for a history path; a legacy .json path maps to the .jsonl store it is imported into."""
+    root, ext = os.path.splitext(file_path)
+    if ext.lower() == ".json":
+        return HistoryStore(f"{root}.jsonl", legacy_path=file_path)
+    return HistoryStore(file_path)
 
-def save_history(file_path, history):
-    with open(file_path, 'w') as file:
-        json.dump(history, file, indent=4)
+def load_history(file_path):
+    return history_store(file_path).load()
 
 def update_history(file_path, question, answer):
-    history = load_history(file_path)
-    history["questions"].append(question)
-    history["answers"].append(answer)
-    save_history(file_path, history)
+    history_store(file_path).append(question, answer)
 
 def save_answer_to_file(filename, answer):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -257,9 +756,93 @@ def save_answer_to_file(filename, answer):
         file.write(answer)
     print(f"Answer saved to {filename}")
 
-def main():
-    history_file = "chat_history.json"
+def output_file_for(label):
+    # A stable name per label lets each question reuse and incrementally update the workbook
+    return f"{label}_summaries.xlsx"
+
+def count_tokens(text):
+    return len(get_tokenizer().encode_ordinary(text))
+
+def index_signature(folder_info):
+    """Identifies the set of summarized papers, so the index is only rebuilt when it changes."""
+    signature = []
+    for label in folder_info:
+        manifest = load_manifest(manifest_path_for(output_file_for(label)))
+        signature.extend((label, pdf_file, entry["hash"]) for pdf_file, entry in manifest["files"].items())
+    return tuple(signature)
+
+def build_paper_index(folder_info):
+    """Index every summarized paper's summary and full-text passages; returns (index, papers)."""
+    index = PaperIndex()
+    papers = {}
+    for label in folder_info:
+        manifest = load_manifest(manifest_path_for(output_file_for(label)))
+        for pdf_file, entry in manifest["files"].items():
+            record = entry["record"]
+            paper_id = f"{label}/{pdf_file}"
+            summaries = {key: record[key] for key in parameters}
+            papers[paper_id] = (label, record["Paper Name"], summaries)
+            index.add(paper_id, " ".join([record["Paper Name"], *summaries.values()]), kind="summary")
+            full_text = cache.get(cache.digest_key(entry["hash"]), "full_text")
+            for passage in passages(full_text or ""):
+                index.add(paper_id, passage)
+    return index, papers
+
+def retrieve_context(index, papers, question, folder_info):
+    """Build the review context from the papers most relevant to the question, within CONTEXT_TOKEN_BUDGET."""
+    hits = index.search_papers(question, k=TOP_K_PAPERS)
+    while True:
+        sections = []
+        for label in folder_info:
+            label_hits = [(paper_id, excerpts) for paper_id, _, excerpts in hits if papers[paper_id][0] == label]
+            if not label_hits:
+                continue
+            folder_summary = {papers[paper_id][1]: papers[paper_id][2] for paper_id, _ in label_hits}
+            review = create_comprehensive_review(folder_summary, f"{label} research")
+            excerpts = "".join(
+                f"\nExcerpt from {papers[paper_id][1]}:\n{excerpt}\n"
+                for paper_id, paper_excerpts in label_hits for excerpt in paper_excerpts
+            )
+            sections.append(f"\nComprehensive Review for {label}:\n{review}\n{excerpts}")
+        context = "\n".join(sections)
+        # Drop the lowest-ranked paper until the context fits the budget
+        if len(hits) <= 1 or count_tokens(context) <= CONTEXT_TOKEN_BUDGET:
+            return context
+        hits = hits[:-1]
+
+def ask_folders(folder_info, questions, history_path="chat_history.jsonl"):
+    """Answer each of `questions` from the papers in folder_info ({label: folder_path}).
+
+    Folders are summarized (incrementally) before every question, so `questions` may be a
+    generator that waits for input. Yields (question, answer) pairs; every answer is also saved
+    to a file and appended to the chat history.
+    """
+    history = history_store(history_path)
+    index, papers, signature = None, {}, None
+
+    for question in questions:
+        context = history.recent(HISTORY_TOKEN_BUDGET, count_tokens)
+
+        for label, folder_path in folder_info.items():
+            # Summarize papers in the folder; unchanged folders cost only a directory scan.
+            # Each folder's run summary counts only that run; the session summary counts everything
+            telemetry.reset()
+            process_folder(folder_path, output_file_for(label))
+
+        if index_signature(folder_info) != signature:
+            signature = index_signature(folder_info)
+            index, papers = build_paper_index(folder_info)
+
+        # Only the papers relevant to this question are sent, so the prompt size stays flat as folders grow
+        combined_reviews = retrieve_context(index, papers, question, folder_info)
+        message = f"{combined_reviews}\n\nQuestion:\n{question}"
+        
+        answer = ask_chatgpt(message, context)
+        save_answer_to_file("chatgpt_response.txt", answer)
+        history.append(question, answer)
+        yield question, answer
 
+def main():
     num_folders = int(input('How many folders do you want to analyze? '))
     folder_info = {}
     for i in range(num_folders):
@@ -267,34 +850,18 @@ def main():
         label = input(f'Enter the label for folder {i + 1}: ')
         folder_info[label] = folder_path
 
-    all_reviews = []
-
-    while True:
-        history = load_history(history_file)
-        context = "\n".join([f"Q: {q}\nA: {a}" for q, a in zip(history["questions"], history["answers"])])
-
-        question = input('Ask a question (or type "exit" to quit): ').strip()
-        if question.lower() in ['exit', 'quit', 'end']:
-            print("Exiting the program.")
-            break
-
-        print("\nWorking...\n")
-
-        for label, folder_path in folder_info.items():
-            # Summarize papers in the folder
-            output_file = f"{label}_summaries_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            folder_summary = process_folder(folder_path, output_file)
+    def questions():
+        while True:
+            question = input('Ask a question (or type "exit" to quit): ').strip()
+            if question.lower() in ['exit', 'quit', 'end']:
+                print("Exiting the program.")
+                return
+            print("\nWorking...\n")
+            yield question
 
-            broad_topic = f"{label} research"
-            review = create_comprehensive_review(folder_summary, broad_topic)
-            all_reviews.append(f"\nComprehensive Review for {label}:\n{review}\n")    
-        
-        combined_reviews = "\n".join(all_reviews)
-        message = f"{combined_reviews}\n\nQuestion:\n{question}"
-        
-        answer = ask_chatgpt(message, context)
-        save_answer_to_file("chatgpt_response.txt", answer)
-        update_history(history_file, question, answer)
+    for _ in ask_folders(folder_info, questions()):
+        pass
+    telemetry.finish("Session summary", session=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
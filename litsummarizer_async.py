@@ -0,0 +1,182 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+from openai.types.chat import ChatCompletion
+
+from litsummarizer_telemetry import telemetry
+
+# Scheduling limits; keep them at or just below your account's rate limits
+MAX_CONCURRENCY = int(os.environ.get("LITSUMMARIZER_MAX_CONCURRENCY", 16))
+TOKENS_PER_MINUTE = int(os.environ.get("LITSUMMARIZER_TOKENS_PER_MINUTE", 200000))
+MAX_RETRIES = 6
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Cheap token estimate (about 4 characters per token) used for rate-limit budgeting."""
+    prompt_tokens = sum(len(m["content"]) for m in messages) // 4 + 4 * len(messages)
+    return prompt_tokens + (max_tokens or 500)
+
+
+class TokenBucket:
+    """Tokens-per-minute budget shared by every batch of requests the process sends."""
+
+    def __init__(self, tokens_per_minute):
+        self.tokens_per_minute = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def take(self, tokens):
+        """Take tokens from the bucket; returns 0 if they were taken, otherwise seconds to wait before trying again."""
+        # A single request larger than the whole budget can still go once the bucket is full
+        tokens = min(tokens, self.tokens_per_minute)
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.available = min(
+                self.tokens_per_minute,
+                self.available + (now - self.updated) * self.tokens_per_minute / 60
+            )
+            self.updated = now
+            if self.available >= tokens:
+                self.available -= tokens
+                return 0
+            return (tokens - self.available) * 60 / self.tokens_per_minute
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def token_bucket(tokens_per_minute):
+    """The process-wide bucket for a rate limit, so consecutive phases don't each start with a full one."""
+    with _buckets_lock:
+        if tokens_per_minute not in _buckets:
+            _buckets[tokens_per_minute] = TokenBucket(tokens_per_minute)
+        return _buckets[tokens_per_minute]
+
+
+class RateLimiter:
+    """Caps in-flight requests and tokens per minute, and pauses everyone after a 429.
+
+    The token budget lives in the process-wide token_bucket(); the semaphore and lock belong to
+    the event loop of one run_completions() call.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = token_bucket(tokens_per_minute)
+        self.lock = asyncio.Lock()
+
+    async def acquire_tokens(self, tokens):
+        """Wait until the token bucket can cover this request."""
+        async with self.lock:
+            while True:
+                wait = self.bucket.take(tokens)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back every new request for the given number of seconds."""
+        self.bucket.pause(seconds)
+
+
+def _retry_delay(error, attempt):
+    """Backoff for a retryable error: honour Retry-After, otherwise exponential with jitter."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_BACKOFF)
+            except ValueError:
+                pass
+    return min(BASE_BACKOFF * 2 ** attempt, MAX_BACKOFF) * (0.5 + random.random() / 2)
+
+
+async def complete(client, limiter, request, max_retries=MAX_RETRIES, stage="completion", labels=None):
+    """Send one chat completion through the limiter, retrying 429s, 5xxs and timeouts.
+
+    The request's latency (including retries), token usage and retries are recorded under `stage`.
+    """
+    labels = labels or {}
+    tokens = estimate_tokens(request["messages"], request.get("max_tokens"))
+    with telemetry.span(stage, **labels):
+        for attempt in range(max_retries + 1):
+            await limiter.acquire_tokens(tokens)
+            try:
+                async with limiter.semaphore:
+                    response = await client.chat.completions.create(**request)
+                telemetry.record_usage(stage, request.get("model"), getattr(response, "usage", None), **labels)
+                return response
+            except RateLimitError as e:
+                if attempt == max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                limiter.pause(delay)
+                telemetry.record_retry(stage, "rate_limit", attempt=attempt + 1, **labels)
+            except APIStatusError as e:
+                if e.status_code < 500 or attempt == max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                telemetry.record_retry(stage, f"status_{e.status_code}", attempt=attempt + 1, **labels)
+            except (APIConnectionError, APITimeoutError) as e:
+                if attempt == max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                telemetry.record_retry(stage, type(e).__name__, attempt=attempt + 1, **labels)
+            await asyncio.sleep(delay)
+
+
+async def _run_completions(requests, max_concurrency, tokens_per_minute, api_key, stage, labels):
+    limiter = RateLimiter(max_concurrency, tokens_per_minute)
+    # The SDK's own retries would bypass the shared limiter, so all retrying happens here
+    async with AsyncOpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY"), max_retries=0) as client:
+        keys = list(requests)
+        responses = await asyncio.gather(
+            *(complete(client, limiter, requests[key], stage=stage, labels=labels.get(key)) for key in keys),
+            return_exceptions=True
+        )
+    return dict(zip(keys, responses))
+
+
+def run_completions(requests, max_concurrency=None, tokens_per_minute=None, api_key=None,
+                    stage="completion", labels=None, cache=None):
+    """Run a dict of {key: chat.completions.create kwargs} concurrently.
+
+    Returns {key: response} where a request that still failed after retries maps to its exception.
+    Telemetry is recorded under `stage`, tagged with labels[key] (e.g. paper and prompt) when given.
+    With a ResponseCache, cached requests are answered without being sent and new responses are stored.
+    Limits default to MAX_CONCURRENCY and TOKENS_PER_MINUTE as set when the call is made.
+    """
+    max_concurrency = MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+    tokens_per_minute = TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+    results = {}
+    if cache is not None:
+        for key, request in requests.items():
+            cached = cache.get(request)
+            if cached is not None:
+                results[key] = ChatCompletion.model_validate(cached)
+        if results:
+            telemetry.count(stage, "cache_hits", len(results))
+    pending = {key: request for key, request in requests.items() if key not in results}
+    if pending:
+        responses = asyncio.run(_run_completions(pending, max_concurrency, tokens_per_minute, api_key, stage, labels or {}))
+        for key, response in responses.items():
+            if cache is not None and not isinstance(response, Exception):
+                cache.put(pending[key], response)
+            results[key] = response
+    return {key: results[key] for key in requests}
@@ -1,19 +1,34 @@
 import openai
 import os
 import json
+import hashlib
 import tiktoken
-from PyPDF2 import PdfReader
-import pandas as pd
-import requests
-import time
-
-openai.api_key = 'replace-with-your-api-key'
+import litsummarizer_extract
+from litsummarizer_extract import extract_many, extract_pdf_pages
+from litsummarizer_jobs import BatchJobManager
+from litsummarizer_chunking import chunk_text, reduce_prompt
+from litsummarizer_telemetry import telemetry
+from litsummarizer_cache import ResponseCache, atomic_write_json, request_key
+from litsummarizer_dedup import DuplicateIndex, text_signature
+from litsummarizer_text import clean_text_for_excel
+from litsummarizer_output import output_paths_for, write_rows
+
+openai.api_key = os.environ.get("OPENAI_API_KEY", 'replace-with-your-api-key')
 
 # Define model and token limits
 tokenizer = tiktoken.get_encoding("o200k_base")
 MAX_TOKENS = 4096
 MAX_RESPONSE_TOKENS = 1000
 MAX_INPUT_TOKENS = MAX_TOKENS - MAX_RESPONSE_TOKENS
+CHUNK_OVERLAP_TOKENS = 200
+
+# Condense the per-chunk answers of multi-chunk papers with one more request per paper and
+# question, sent as a second batch at batch prices; when False they are joined in chunk order
+REDUCE_CHUNK_ANSWERS = True
+
+# Batch API limits for a single input file
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_FILE_BYTES = 200 * 1024 * 1024
 
 # Define your tailored prompts
 parameters = {
@@ -23,248 +38,555 @@ parameters = {
     "Innovation Measures": "List the top 5 most relevant measures used to quantify innovation in the paper. Each measure should be a bullet point, starting with **, followed by a brief description in one sentence."
 }
 
-def extract_text_from_pdf(file_path):
-    """Extract text from a PDF."""
-    with open(file_path, 'rb') as file:
-        reader = PdfReader(file)
-        text = ''.join([page.extract_text() or '' for page in reader.pages])
-    return text
-
-def split_text_by_tokens(text, max_tokens=MAX_INPUT_TOKENS):
-    """Split text into chunks based on token limit."""
-    tokens = tokenizer.encode(text)
-    chunks = [tokenizer.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
-    return chunks
-
-def upload_jsonl_file(jsonl_file):
-    """Uploads the JSONL file to OpenAI's Files API."""
-    try:
-        with open(jsonl_file, 'rb') as f:
-            batch_input_file = openai.File.create(
-                file=f,
-                purpose='batch'  # Changed from 'fine-tune' to 'batch'
-            )
-        file_id = batch_input_file['id']
-
-        # Verify that the file_id starts with 'file-'
-        if not file_id.startswith('file-'):
-            raise ValueError(f"Invalid file ID: {file_id}. Expected an ID that starts with 'file-'.")
-
-        print(f"Batch input file uploaded with ID: {file_id}")
-        return file_id
-
-    except Exception as e:
-        print(f"Error during file upload: {e}")
-        return None
+# Requests answered before (by an earlier batch or realtime run) are replayed instead of resubmitted
+response_cache = ResponseCache()
 
+SYSTEM_PROMPT = "You are an experienced research assistant with PhD in Economics at Harvard University. Your role is to conduct a literature review on given papers. For each paper, you will summarize the papers. More specifically, the purpose is to get at the all the measures that papers use to quantify innovation."
 
-# Prepare batch input for each PDF and save it to a .jsonl file
-def prepare_batch_input_for_batch_api(folder_path, output_jsonl_file):
-    pdf_files = [f for f in os.listdir(folder_path) if f.endswith('.pdf')]
-    batch_input = []
-
-    for pdf_file in pdf_files:
-        file_path = os.path.join(folder_path, pdf_file)
-        text = extract_text_from_pdf(file_path)
-        chunks = split_text_by_tokens(text)
+def extract_text_from_pdf(file_path):
+    """Extract text from a PDF."""
+    return '\n'.join(extract_pdf_pages(file_path))
+
+def split_text_by_tokens(text, max_tokens=MAX_INPUT_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Split text into chunks based on token limit, cutting at sentence or section boundaries."""
+    return chunk_text(text, max_tokens, overlap_tokens, tokenizer=tokenizer)
+
+def new_batch_manifest():
+    """Side-car manifest of a batch input: request i (custom_id "i") asks questions[q] about chunk c of papers[p].
+
+    "requests" holds [p, c, q] per request ID and "chunks" the number of chunks per paper, so a
+    result line is joined back by list index instead of by parsing its custom_id. "duplicates"
+    maps each PDF that was not submitted because it copies another onto that PDF. The prompts
+    are recorded too, so results can be collected by a process with a different prompt set.
+    """
+    return {
+        "papers": [], "chunks": [], "questions": list(parameters), "requests": [], "duplicates": {},
+        "prompts": list(parameters.values()), "system": SYSTEM_PROMPT
+    }
 
-        for i, chunk in enumerate(chunks):
-            for question, prompt in parameters.items():
-                # # Use exact keys from parameters for custom_id
-                # custom_id = f"{pdf_file}_chunk_{i+1}_{question.replace(' ', '_')}"
-                # Create custom_id without modifying the key's spaces
-                custom_id = f"{pdf_file}_chunk_{i+1}_{question}"
-                request = {
-                    "custom_id": custom_id,
-                    "method": "POST",
-                    "url": "/v1/chat/completions",
-                    "body": {
-                        "model": "gpt-4o-mini",
-                        "messages": [
-                            {"role": "system", "content": "You are an experienced research assistant with PhD in Economics at Harvard University. Your role is to conduct a literature review on given papers. For each paper, you will summarize the papers. More specifically, the purpose is to get at the all the measures that papers use to quantify innovation."},
-                            {"role": "user", "content": f"{prompt}\n\n{chunk}"}
-                        ],
-                        "max_tokens": MAX_RESPONSE_TOKENS
-                    }
-                }
-                batch_input.append(request)
 
-    with open(output_jsonl_file, 'w') as f:
-        for entry in batch_input:
-            f.write(json.dumps(entry) + '\n')
+def use_prompt_set(prompt_set):
+    """Submit a prompt set from load_prompt_set() instead of the built-in `parameters`."""
+    global parameters, SYSTEM_PROMPT
+    parameters = dict(prompt_set["questions"])
+    if prompt_set.get("system"):
+        SYSTEM_PROMPT = prompt_set["system"]
 
-    print(f"Batch input file '{output_jsonl_file}' created successfully.")
 
+def prompt_fingerprint():
+    """Changes whenever the prompts change, so a run's batches are never resumed with other prompts."""
+    return hashlib.sha256(json.dumps([SYSTEM_PROMPT, parameters]).encode('utf-8')).hexdigest()
 
-def submit_batch_job(file_id):
-    headers = {
-        'Authorization': f'Bearer {openai.api_key}',
-        'Content-Type': 'application/json',
-    }
 
-    data = {
-        "input_file_id": file_id,
-        "endpoint": "/v1/chat/completions",
-        "completion_window": "24h",
-        "metadata": {"description": "Summarize research papers batch job"}
-    }
+def batch_manifest_path(output_jsonl_file):
+    stem, ext = os.path.splitext(output_jsonl_file)
+    return f"{stem}.ids.json"
 
-    response = requests.post('https://api.openai.com/v1/batches', headers=headers, json=data)
-    batch_job = response.json()
 
-    # Check if 'id' exists before trying to access it
-    if 'id' in batch_job:
-        print(f"Batch job created with ID: {batch_job['id']}")
-        return batch_job['id']
-    else:
-        print(f"Error in batch job creation: {batch_job}")
-        return None
+def save_batch_manifest(path, manifest):
+    atomic_write_json(path, manifest, separators=(',', ':'))
 
-def monitor_batch_completion(batch_id):
-    """Monitors the batch until it is completed."""
-    while True:
-        status, batch_status = check_batch_status(batch_id)
-        print(f"Batch status: {status}")  # Log the status each time
-        if status == 'completed':
-            print("Batch job completed.")
-            return batch_status['output_file_id']
-        elif status == 'failed':
-            print("Batch job failed.")
-            return None
-        else:
-            print(f"Waiting for batch completion...")
-            time.sleep(600)  # Check every 60 seconds
 
+def load_batch_manifest(path):
+    with open(path, 'r') as f:
+        return json.load(f)
 
-def check_batch_status(batch_id):
-    """Check the status of the batch job."""
-    headers = {
-        'Authorization': f'Bearer {openai.api_key}',
-        'Content-Type': 'application/json',
-    }
 
-    try:
-        response = requests.get(f'https://api.openai.com/v1/batches/{batch_id}', headers=headers)
-        batch_status = response.json()
-
-        # Check if 'status' is in the response
-        if 'status' in batch_status:
-            return batch_status['status'], batch_status
-        else:
-            print(f"Error: 'status' key not found in response: {batch_status}")
-            return None, batch_status
-
-    except Exception as e:
-        print(f"Exception occurred while checking batch status: {e}")
-        return None, None
-
-def process_batch_results(output_file_id):
-    """Processes the batch output from OpenAI."""
-    headers = {
-        'Authorization': f'Bearer {openai.api_key}',
-        'Content-Type': 'application/json',
-    }
+def iter_paper_requests(folder_path, manifest):
+    """Yield (pdf_file, requests) per paper, extracting, tokenizing and chunking one paper at a time.
 
-    # Retrieve the batch output
-    response = requests.get(f'https://api.openai.com/v1/files/{output_file_id}/content', headers=headers)
+    Each paper and request is registered in `manifest`; custom_ids are the request's index in it.
+    Copies of a paper already seen (exact or near duplicates) get no requests and are recorded
+    in manifest["duplicates"] instead. Papers are registered in file name order, so which copy
+    counts as the original doesn't depend on which PDF finished parsing first.
+    """
+    pdf_files = sorted(f for f in os.listdir(folder_path) if f.endswith('.pdf'))
+    file_paths = [os.path.join(folder_path, f) for f in pdf_files]
+    duplicates = DuplicateIndex()
 
-    # Save results locally
-    with open('batch_output.jsonl', 'w') as f:
-        f.write(response.text)
-    print("Batch results saved to 'batch_output.jsonl'.")
+    # PDFs are parsed in parallel worker processes and arrive in completion order; those that
+    # finish ahead of an earlier file wait here until its turn. A slow PDF would otherwise let
+    # every later paper pile up here, so parsing runs at most two files per worker ahead of it
+    arrived = {}
+    next_paper = 0
+    lookahead = 2 * max(1, litsummarizer_extract.EXTRACT_WORKERS)
+    for file_path, pages, error in extract_many(file_paths, lookahead=lookahead):
+        arrived[file_path] = (pages, error)
+        while next_paper < len(file_paths) and file_paths[next_paper] in arrived:
+            pages, error = arrived.pop(file_paths[next_paper])
+            pdf_file = pdf_files[next_paper]
+            next_paper += 1
+            requests_for_paper = _paper_requests(pdf_file, pages, error, duplicates, manifest)
+            if requests_for_paper is not None:
+                yield pdf_file, requests_for_paper
 
-    results = []
-    with open('batch_output.jsonl', 'r') as f:
-        batch_output = [json.loads(line) for line in f]
 
-    file_summaries = {}
+def _paper_requests(pdf_file, pages, error, duplicates, manifest):
+    """Register one extracted paper in `manifest` and return its requests, or None if it gets none."""
+    if error is not None:
+        print(f"Failed to extract text from {pdf_file}: {error}")
+        return None
+    text = '\n'.join(pages)
+    with telemetry.span("dedup", paper=pdf_file):
+        match = duplicates.add(pdf_file, text_signature(text))
+    if match is not None:
+        print(f"{pdf_file} duplicates {match[0]} ({match[1]:.0%} similar); reusing its summary.")
+        manifest["duplicates"][pdf_file] = match[0]
+        return None
+    with telemetry.span("chunk", paper=pdf_file):
+        chunks = split_text_by_tokens(text)
+    paper = len(manifest["papers"])
+    manifest["papers"].append(pdf_file)
+    manifest["chunks"].append(len(chunks))
+    requests_for_paper = []
+    for c, chunk in enumerate(chunks):
+        for q, prompt in enumerate(parameters.values()):
+            requests_for_paper.append(batch_request(str(len(manifest["requests"])), prompt, chunk))
+            manifest["requests"].append([paper, c, q])
+    return requests_for_paper
+
+
+def batch_request(custom_id, prompt, chunk):
+    """Build one Batch API line asking `prompt` about a chunk of a paper."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"{prompt}\n\n{chunk}"}
+            ],
+            "max_tokens": MAX_RESPONSE_TOKENS
+        }
+    }
 
-    for entry in batch_output:
-        custom_id = entry['custom_id']
-        print(f"Processing custom_id: {custom_id}")
 
-        try:
-            # Extract filename and question directly without replacing underscores
-            filename, chunk_info = custom_id.split("_chunk_", 1)
-            chunk_number, question = chunk_info.rsplit("_", 1)
-            question = question.strip()  # Just strip any potential whitespace
-        except IndexError:
-            print(f"Error processing custom_id: {custom_id}. Skipping...")
+def cached_output_path(output_jsonl_file):
+    """Where prepare_batch_input_for_batch_api() writes replayed responses, in batch output format."""
+    stem, ext = os.path.splitext(output_jsonl_file)
+    return f"{stem}.cached{ext}"
+
+
+def reduce_input_path(output_jsonl_file):
+    """Batch input of the second round, which condenses multi-chunk answers (batch_input.reduce.jsonl)."""
+    stem, ext = os.path.splitext(output_jsonl_file)
+    return f"{stem}.reduce{ext}"
+
+
+def batch_part_path(output_jsonl_file, part):
+    """batch_input.jsonl, batch_input_2.jsonl, batch_input_3.jsonl, ..."""
+    if part == 1:
+        return output_jsonl_file
+    stem, ext = os.path.splitext(output_jsonl_file)
+    return f"{stem}_{part}{ext}"
+
+
+# Prepare batch input for each PDF and save it to one or more .jsonl files
+def prepare_batch_input_for_batch_api(folder_path, output_jsonl_file,
+                                      max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_FILE_BYTES):
+    """Stream batch requests to JSONL, starting a new file before any Batch API per-file limit is hit.
+
+    Only one paper's requests are held in memory at a time, and a paper's requests never span two
+    files. Requests found in the response cache are not submitted; their cached responses are
+    written to cached_output_path() as batch output lines instead. The ID manifest that maps
+    custom_ids back to papers, chunks and questions is written to batch_manifest_path().
+    Returns the list of files written.
+    """
+    manifest = new_batch_manifest()
+    output_files = []
+    out = None
+    file_requests = file_bytes = 0
+    papers = total_requests = replayed = 0
+    replay_path = cached_output_path(output_jsonl_file)
+    replay_out = open(replay_path, 'w')
+
+    for pdf_file, requests_for_paper in iter_paper_requests(folder_path, manifest):
+        # Building and serializing one paper's requests
+        with telemetry.span("prepare", paper=pdf_file):
+            lines = []
+            for entry in requests_for_paper:
+                cached = response_cache.get(entry["body"])
+                if cached is not None:
+                    replay_out.write(json.dumps({
+                        "custom_id": entry["custom_id"], "response": {"status_code": 200, "body": cached}, "error": None,
+                        "cached": True
+                    }) + '\n')
+                    replayed += 1
+                    continue
+                lines.append((json.dumps(entry) + '\n').encode('utf-8'))
+        if not lines:
+            papers += 1
             continue
-
-        # Initialize file summary if not already present
-        if filename not in file_summaries:
-            file_summaries[filename] = {key: "" for key in parameters.keys()}
-
-        # Check if the extracted question matches the parameters key directly
-        if question not in parameters:
-            print(f"Invalid question key: {question}. Skipping...")
+        paper_bytes = sum(len(line) for line in lines)
+        if len(lines) > max_requests or paper_bytes > max_bytes:
+            print(f"Skipping {pdf_file}: its {len(lines)} requests ({paper_bytes} bytes) exceed a single batch file.")
             continue
 
-        # Get the content of the response
-        if 'response' in entry and 'body' in entry['response'] and 'choices' in entry['response']['body']:
-            chunk_summary = entry['response']['body']['choices'][0]['message']['content']
-        else:
-            chunk_summary = f"No 'choices' found for {custom_id}"
-            print(f"Warning: No 'choices' found for {custom_id}")
+        if out is None or file_requests + len(lines) > max_requests or file_bytes + paper_bytes > max_bytes:
+            if out is not None:
+                out.close()
+            output_files.append(batch_part_path(output_jsonl_file, len(output_files) + 1))
+            out = open(output_files[-1], 'wb')
+            file_requests = file_bytes = 0
+
+        out.writelines(lines)
+        file_requests += len(lines)
+        file_bytes += paper_bytes
+        papers += 1
+        total_requests += len(lines)
+        print(f"Prepared {papers} papers, {total_requests} requests in {len(output_files)} file(s)")
+
+    if out is not None:
+        out.close()
+    replay_out.close()
+    save_batch_manifest(batch_manifest_path(output_jsonl_file), manifest)
+    if replayed:
+        telemetry.count("batch", "cache_hits", replayed)
+        print(f"{replayed} requests answered from the response cache ('{replay_path}').")
+    else:
+        os.remove(replay_path)
+
+    for path in output_files:
+        print(f"Batch input file '{path}' created successfully.")
+    return output_files
+
+
+def write_batch_inputs(plan, jsonl_file, max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_FILE_BYTES):
+    """Write {key: request} as Batch API input (custom_ids "0", "1", ...), split by the per-file limits; returns the files written."""
+    paths = []
+    out = None
+    file_requests = file_bytes = 0
+    for custom_id, request in enumerate(plan.values()):
+        line = (json.dumps({
+            "custom_id": str(custom_id), "method": "POST", "url": "/v1/chat/completions", "body": request
+        }) + '\n').encode('utf-8')
+        if out is None or file_requests + 1 > max_requests or file_bytes + len(line) > max_bytes:
+            if out is not None:
+                out.close()
+            paths.append(batch_part_path(jsonl_file, len(paths) + 1))
+            out = open(paths[-1], 'wb')
+            file_requests = file_bytes = 0
+        out.write(line)
+        file_requests += 1
+        file_bytes += len(line)
+    if out is not None:
+        out.close()
+    return paths
+
+
+def _entry_error(entry):
+    """The error message of a failed batch output or error file line, or None if it succeeded."""
+    response = entry.get('response') or {}
+    if entry.get('error'):
+        return entry['error'].get('message') or str(entry['error'])
+    if response.get('status_code', 200) != 200:
+        body = response.get('body') or {}
+        return (body.get('error') or {}).get('message') or f"HTTP {response['status_code']}"
+    if 'choices' not in (response.get('body') or {}):
+        return "no 'choices' in response"
+    return None
+
+
+def read_batch_outputs(manifest, output_paths, error_paths=(), record_usage=True):
+    """Parse batch output and error files line by line, joining each line to its request via the ID manifest.
+
+    Returns ({filename: {question: [answer or None per chunk]}}, {custom_id: error}). Only the
+    answer text of each line is kept; a request that failed in one batch but succeeded in a
+    resubmitted one is not reported as failed. Token usage is recorded per paper and prompt
+    unless record_usage is off (for a second pass over the same files).
+    """
+    questions = manifest["questions"]
+    # answers[paper][question][chunk], preallocated so results land in document order whatever the line order
+    answers = [[[None] * chunks for _ in questions] for chunks in manifest["chunks"]]
+    failed = {}
+
+    for path in list(output_paths) + list(error_paths):
+        with open(path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                custom_id = entry['custom_id']
+                try:
+                    paper, chunk, question = manifest["requests"][int(custom_id)]
+                except (ValueError, IndexError):
+                    print(f"Unknown custom_id: {custom_id}. Skipping...")
+                    continue
+
+                # Failed requests may succeed in a resubmitted batch, so only remember the error for now
+                error = _entry_error(entry)
+                if error is not None:
+                    failed[custom_id] = (paper, chunk, question, error)
+                    continue
+
+                body = entry['response']['body']
+                answers[paper][question][chunk] = body['choices'][0]['message']['content']
+                if record_usage and not entry.get('cached'):
+                    telemetry.record_usage("batch", body.get('model'), body.get('usage'), batch=True,
+                                           paper=manifest["papers"][paper], prompt=questions[question], chunk=chunk)
+
+    failed = {
+        custom_id: error for custom_id, (paper, chunk, question, error) in failed.items()
+        if answers[paper][question][chunk] is None
+    }
+    file_summaries = {
+        filename: dict(zip(questions, paper_answers))
+        for filename, paper_answers, chunks in zip(manifest["papers"], answers, manifest["chunks"]) if chunks
+    }
+    return file_summaries, failed
+
+
+def describe_request(manifest, custom_id):
+    """Human-readable "file, chunk n, question" for a custom_id."""
+    paper, chunk, question = manifest["requests"][int(custom_id)]
+    return f"{manifest['papers'][paper]}, chunk {chunk + 1}, {manifest['questions'][question]}"
+
+
+def iter_batch_rows(manifest_path, output_paths, error_paths=()):
+    """Yield one row per paper from downloaded batch output files, reporting requests that failed for good."""
+    manifest = load_batch_manifest(manifest_path)
+    file_summaries, failed = read_batch_outputs(manifest, output_paths, error_paths)
+    if failed:
+        print(f"{len(failed)} batch requests failed:")
+        for custom_id, error in failed.items():
+            print(f"  {describe_request(manifest, custom_id)}: {error}")
+
+    copies = {}
+    for duplicate, original in manifest.get("duplicates", {}).items():
+        copies.setdefault(original, []).append(duplicate)
+
+    prompts = dict(zip(manifest["questions"], manifest["prompts"])) if "prompts" in manifest else None
+    merged = merge_chunk_answers(file_summaries, prompts, manifest.get("system"))
+    for filename in list(merged):
+        # Hand each row over and drop it, so rows aren't held twice while they are written
+        summary = merged.pop(filename)
+        for question, answer in summary.items():
+            if not answer:
+                summary[question] = f"No 'choices' found for {filename} {question}"
+        # Answers keep their line breaks (bullet lists) but lose characters openpyxl rejects
+        row = {'Filename': filename}
+        for question in manifest["questions"]:
+            row[question] = clean_text_for_excel(summary[question], keep_newlines=True).strip()
+        yield row
+        # Duplicate PDFs share the summary of the copy that was submitted
+        for duplicate in sorted(copies.get(filename, ())):
+            yield dict(row, Filename=duplicate)
+
+
+def summarize_batch_outputs(manifest_path, output_paths, error_paths=()):
+    """Merge one or more downloaded batch output files into one row per paper."""
+    return list(iter_batch_rows(manifest_path, output_paths, error_paths))
+
+
+def cache_batch_outputs(manager, cache=None, record_usage=False, jobs=None, stage="batch"):
+    """Store every successful response of the manager's finished batches (or of `jobs`) in the response cache.
+
+    With record_usage, each response's token usage is also recorded as batch usage under `stage`;
+    leave it off when the outputs are read with read_batch_outputs(), which records usage per
+    paper and prompt.
+    """
+    cache = cache or response_cache
+    stored = 0
+    for job in manager.jobs.values() if jobs is None else jobs:
+        if not job.get("output_path"):
+            continue
+        # Only each request's cache key is kept in memory, not its (large) body
+        with open(job["input_path"], 'r') as f:
+            keys = {}
+            for line in f:
+                entry = json.loads(line)
+                keys[entry["custom_id"]] = (request_key(entry["body"]), entry["body"].get("model"))
+        with open(job["output_path"], 'r') as f:
+            for line in f:
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                if response.get("status_code") == 200 and entry["custom_id"] in keys:
+                    key, model = keys[entry["custom_id"]]
+                    cache.put_key(key, model, response["body"], commit=False)
+                    if record_usage:
+                        telemetry.record_usage(stage, model, response["body"].get("usage"), batch=True)
+                    stored += 1
+        cache.conn.commit()
+    return stored
+
+
+def chunk_reduce_requests(file_summaries, prompts=None, system_prompt=None):
+    """{(filename, question): request} condensing the answers of every paper and question that spans several chunks.
+
+    `prompts` ({question: prompt}) and `system_prompt` default to the current prompt set.
+    """
+    prompts = parameters if prompts is None else prompts
+    system_prompt = system_prompt or SYSTEM_PROMPT
+    requests = {}
+    for filename, summary in file_summaries.items():
+        for question, chunk_answers in summary.items():
+            answers = [answer for answer in chunk_answers if answer is not None]
+            if len(answers) > 1:
+                requests[(filename, question)] = {
+                    "model": "gpt-4o-mini",
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": reduce_prompt(prompts[question], answers)}
+                    ],
+                    "max_tokens": MAX_RESPONSE_TOKENS
+                }
+    return requests
 
-        # Append the response to the appropriate section
-        file_summaries[filename][question] += chunk_summary + " "
 
+def merge_chunk_answers(file_summaries, prompts=None, system_prompt=None):
+    """Turn {filename: {question: [answer or None per chunk]}} into one answer per paper and question.
 
-    # Prepare results for Excel
+    With REDUCE_CHUNK_ANSWERS, multi-chunk answers are replaced by their condensed answer from
+    the response cache, where submit_reduce_batch() puts them; chunk answers are joined in
+    order where there is none.
+    """
+    merged = {}
     for filename, summary in file_summaries.items():
-        results.append({
-            'Filename': filename,
-            'Research Question': summary['Research Question'].strip(),
-            'Key Findings': summary['Key Findings'].strip(),
-            'Data Sources': summary['Data Sources'].strip(),
-            'Innovation Measures': summary['Innovation Measures'].strip()
-        })
-
-    return results
-
+        merged[filename] = {}
+        for question, chunk_answers in summary.items():
+            answers = [answer for answer in chunk_answers if answer is not None]
+            merged[filename][question] = " ".join(answer.strip() for answer in answers)
+    if not REDUCE_CHUNK_ANSWERS:
+        return merged
+
+    uncondensed = 0
+    for (filename, question), request in chunk_reduce_requests(file_summaries, prompts, system_prompt).items():
+        cached = response_cache.get(request)
+        if cached is None:
+            uncondensed += 1
+            continue
+        merged[filename][question] = cached["choices"][0]["message"]["content"]
+    if uncondensed:
+        print(f"{uncondensed} multi-chunk answers could not be condensed; their chunk answers are joined instead.")
+    return merged
+
+
+def _round_jobs(manager, jsonl_file, reduce=False):
+    """The manager's jobs of the first round (chunk questions) or, with reduce, of the second (condensing)."""
+    stem = os.path.splitext(reduce_input_path(jsonl_file))[0]
+    return [job for job in manager.jobs.values() if job["input_path"].startswith(stem) == reduce]
+
+
+def submit_reduce_batch(jsonl_file, output_paths, manager):
+    """Condense the multi-chunk answers in output_paths with a second batch; returns True once every answer is in.
+
+    The condensing requests go through `manager` (and its state file) like the first round, at
+    batch prices. Their answers are loaded into the response cache for merge_chunk_answers().
+    """
+    reduce_stem = os.path.splitext(reduce_input_path(jsonl_file))[0]
+    if any(path.startswith(reduce_stem) for path in manager.inputs):
+        if manager.active_jobs() or manager.pending_inputs():
+            return False
+        cache_batch_outputs(manager, record_usage=True, jobs=_round_jobs(manager, jsonl_file, reduce=True),
+                            stage="reduce")
+        return True
+
+    manifest = load_batch_manifest(batch_manifest_path(jsonl_file))
+    file_summaries, _ = read_batch_outputs(manifest, output_paths, record_usage=False)
+    prompts = dict(zip(manifest["questions"], manifest["prompts"])) if "prompts" in manifest else None
+    requests = {
+        key: request for key, request in chunk_reduce_requests(file_summaries, prompts, manifest.get("system")).items()
+        if not response_cache.contains(request)
+    }
+    if not requests:
+        return True
+    manager.add_inputs(write_batch_inputs(requests, reduce_input_path(jsonl_file)))
+    manager.submit_inputs()
+    print(f"Submitted {len(requests)} requests condensing multi-chunk answers as a second batch; "
+          "the workbook is written once it finishes.")
+    return False
 
 
 def save_to_excel(summary_data, output_path):
-    """Save summarized data to an Excel file."""
-    if not summary_data:
+    """Stream summarized rows (a list or any iterable of dicts) to an Excel file, plus any extra output formats."""
+    paths = output_paths_for(output_path)
+    rows = write_rows(summary_data, paths)
+    if not rows:
         print("No data to write to Excel.")
         return
-    df = pd.DataFrame(summary_data)
-    print(f"Writing the following data to Excel:\n{df}")  # Debugging print to check data
-    df.to_excel(output_path, index=False)
-    print(f"Summary data saved to {output_path}")
+    print(f"Summary data ({rows} rows) saved to {', '.join(paths)}")
+
+
+def submit_batches(folder_path, jsonl_file, manager):
+    """Prepare the batch input for a folder and submit every part; returns the number of batches submitted.
+
+    While the manager still has unfinished batches (or unsubmitted parts) of the same folder,
+    input file and prompts, nothing is prepared again, so a rerun resumes them instead of paying
+    for them twice; only the parts whose submission was interrupted are submitted. Returns None
+    if there was nothing to submit, or if the unfinished batches belong to another run.
+    """
+    run_info = {"folder": os.path.abspath(folder_path), "input": os.path.abspath(jsonl_file),
+                "prompts": prompt_fingerprint()}
+    if manager.active_jobs() or manager.pending_inputs():
+        if manager.run_info != run_info:
+            print(f"'{manager.state_path}' holds the unfinished batches of another run ({manager.run_info.get('folder')}, "
+                  "or a different input file or prompts). Collect that run first, or delete the file to start over.")
+            return None
+        print(f"Resuming {len(manager.active_jobs())} unfinished batch jobs from '{manager.state_path}'.")
+        print(f"Delete '{manager.state_path}' to start a new run.")
+        return manager.submit_inputs()
+    if manager.jobs:
+        print(f"The finished batches in '{manager.state_path}' were never collected; starting a new run.")
+    manager.clear()
+
+    # Prepare the batch input, split into as many files as the Batch API limits require
+    jsonl_files = prepare_batch_input_for_batch_api(folder_path, jsonl_file)
+    if not jsonl_files and not os.path.exists(cached_output_path(jsonl_file)):
+        print("Error: No batch input was created.")
+        return None
+
+    # Every part is recorded before any is uploaded; the job manager records each batch in its state file
+    manager.run_info = run_info
+    manager.add_inputs(jsonl_files)
+    return manager.submit_inputs()
+
+
+def collect_batches(jsonl_file, output_path, manager):
+    """Write one row per paper from the manager's finished batches and the replayed cached responses.
+
+    With REDUCE_CHUNK_ANSWERS, the first call submits a second batch condensing multi-chunk answers
+    and returns False; call it again once that batch has finished. The manager's state file is
+    deleted once the workbook is written, so the next submit_batches() starts a new run.
+    Returns True once written, or None if no run is tracked (nothing was submitted, or it was
+    collected already).
+    """
+    if not (manager.jobs or manager.run_info):
+        print(f"No batch run is tracked in '{manager.state_path}'; submit one first.")
+        return None
+    jobs = _round_jobs(manager, jsonl_file)
+    cache_batch_outputs(manager, jobs=jobs)
+    replayed = [cached_output_path(jsonl_file)] if os.path.exists(cached_output_path(jsonl_file)) else []
+    output_paths = replayed + [job["output_path"] for job in jobs if job.get("output_path")]
+    if REDUCE_CHUNK_ANSWERS and not submit_reduce_batch(jsonl_file, output_paths, manager):
+        return False
+    rows = iter_batch_rows(batch_manifest_path(jsonl_file), output_paths,
+                           [job["error_path"] for job in jobs if job.get("error_path")])
+    save_to_excel(rows, output_path)
+    manager.clear()
+    return True
 
 
 def main():
     folder_path = "./detection"  # Adjust this to your folder
     jsonl_file = "batch_input.jsonl"
-    
-    # Step 1: Prepare the batch input
-    prepare_batch_input_for_batch_api(folder_path, jsonl_file)
-    
-    # Step 2: Upload the batch file
-    file_id = upload_jsonl_file(jsonl_file)
-    if not file_id:
-        print("Error: File upload failed. Exiting.")
-        return
+    manager = BatchJobManager(openai.api_key)
 
-    # Step 3: Submit the batch job
-    batch_id = submit_batch_job(file_id)
-    if not batch_id:
-        print("Error: Batch job creation failed. Exiting.")
+    # Steps 1-3: Prepare, upload and submit the batch input (or resume the batches of an earlier run)
+    if submit_batches(folder_path, jsonl_file, manager) is None:
+        print("Exiting.")
         return
 
-    # Step 4: Monitor batch completion
-    output_file_id = monitor_batch_completion(batch_id)
-    if not output_file_id:
-        print("Error: Batch job did not complete successfully. Exiting.")
-        return
+    # Step 4: Poll every batch until it finishes, resubmitting failed or expired requests
+    manager.run()
 
-    # Step 5: Process and save results
-    results = process_batch_results(output_file_id)
-    save_to_excel(results, "summarized_papers.xlsx")
+    # Step 5: Process and save results from all downloaded outputs, plus the replayed cached responses;
+    # a second round of batches condenses the answers of papers that span several chunks first
+    while collect_batches(jsonl_file, "summarized_papers.xlsx", manager) is False:
+        manager.run()
+    telemetry.finish()
+    print(response_cache.stats())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from litsummarizer_telemetry import telemetry
+
+# Where the extraction cache lives and how large it may grow before old entries are evicted
+CACHE_PATH = os.environ.get("LITSUMMARIZER_CACHE", ".litsummarizer_cache.sqlite")
+CACHE_MAX_BYTES = int(os.environ.get("LITSUMMARIZER_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Chat completion responses are kept this many seconds (0 turns the response cache off)
+RESPONSE_CACHE_TTL = float(os.environ.get("LITSUMMARIZER_RESPONSE_CACHE_TTL", 30 * 24 * 3600))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("LITSUMMARIZER_RESPONSE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Request fields that change how a request is sent, not what the model answers
+TRANSPORT_FIELDS = {"timeout", "extra_headers", "extra_query", "extra_body", "user", "metadata", "stream"}
+
+
+def file_digest(file_path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_write_json(path, value, **dump_kwargs):
+    """Write value to path as JSON through a temporary file, so readers never see a half-written file."""
+    # The PID keeps processes that share a folder (queue workers) off each other's temporary file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+
+def _table_bytes(conn, table):
+    return conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+
+
+def evict_lru(conn, table, max_bytes):
+    """Delete the least recently used rows of a cache table until it is back under budget; returns its new size.
+
+    The table needs `size` and `last_access` columns.
+    """
+    # Other processes may share the file, so start from the table's actual size, and free down to
+    # 90% of the budget so a full cache doesn't evict on every put
+    to_free = _table_bytes(conn, table) - int(max_bytes * 0.9)
+    victims = []
+    if to_free > 0:
+        for rowid, size in conn.execute(f"SELECT rowid, size FROM {table} ORDER BY last_access"):
+            victims.append((rowid,))
+            to_free -= size
+            if to_free <= 0:
+                break
+        conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", victims)
+    conn.commit()
+    return _table_bytes(conn, table)
+
+
+def summary_field(model, system_prompt, prompt):
+    """Cache field name for one summary prompt, so edited prompts never hit stale answers."""
+    prompt_hash = hashlib.sha256(f"{system_prompt}\x00{prompt}".encode('utf-8')).hexdigest()[:16]
+    return f"summary:{model}:{prompt_hash}"
+
+
+class ExtractionCache:
+    """Content-addressed, size-bounded LRU cache of per-PDF extraction and summary results.
+
+    Entries are keyed by the PDF's SHA-256 plus the extractor name and version, so a renamed
+    or copied PDF is a hit while a pdfminer upgrade invalidates everything it produced.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, extractor="pdfminer", version=""):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.extractor = extractor
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " doc_key TEXT NOT NULL,"
+            " field TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " PRIMARY KEY (doc_key, field))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.conn.commit()
+        # Kept up to date on put() so the table only has to be summed when evicting
+        self.total_bytes = _table_bytes(self.conn, "entries")
+
+    def document_key(self, file_path):
+        """Hash the PDF and return the key all of its cached fields are stored under."""
+        return self.digest_key(file_digest(file_path))
+
+    def digest_key(self, digest):
+        """Key for a PDF whose SHA-256 digest is already known."""
+        return f"{digest}:{self.extractor}:{self.version}"
+
+    def get(self, doc_key, field):
+        """Return the cached value for (doc_key, field), or None on a miss."""
+        if doc_key is None:
+            return None
+        row = self.conn.execute(
+            "SELECT value FROM entries WHERE doc_key = ? AND field = ?", (doc_key, field)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE entries SET last_access = ? WHERE doc_key = ? AND field = ?",
+            (time.time(), doc_key, field)
+        )
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, doc_key, field, value):
+        """Store a JSON-serialisable value and evict least recently used entries if over budget."""
+        if doc_key is None:
+            return
+        payload = json.dumps(value)
+        previous = self.conn.execute(
+            "SELECT size FROM entries WHERE doc_key = ? AND field = ?", (doc_key, field)
+        ).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (doc_key, field, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+            (doc_key, field, payload, len(payload), time.time())
+        )
+        self.conn.commit()
+        self.total_bytes += len(payload) - (previous[0] if previous else 0)
+        if self.total_bytes > self.max_bytes:
+            self.total_bytes = evict_lru(self.conn, "entries", self.max_bytes)
+
+    def close(self):
+        self.conn.close()
+
+
+def request_key(request):
+    """Hash of a normalized chat completion request (model, messages, max_tokens, temperature, ...).
+
+    Realtime create() kwargs and Batch API request bodies of the same request hash alike.
+    """
+    normalized = {key: value for key, value in request.items() if key not in TRANSPORT_FIELDS and value is not None}
+    payload = json.dumps(normalized, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite cache of chat completion responses keyed on the normalized request.
+
+    Entries expire `ttl` seconds after they were stored, and the least recently used ones are
+    evicted once the table grows past `max_bytes`. Responses are stored as the API's JSON body,
+    so realtime responses and Batch API output lines can be replayed for each other.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " request_key TEXT PRIMARY KEY,"
+            " model TEXT,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.conn.commit()
+        self.total_bytes = _table_bytes(self.conn, "responses")
+
+    def get(self, request):
+        """Return the cached response body (a dict) for a request, or None on a miss or expiry."""
+        if not self.ttl:
+            return None
+        key = request_key(request)
+        row = self.conn.execute("SELECT value, created FROM responses WHERE request_key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute("UPDATE responses SET last_access = ? WHERE request_key = ?", (now, key))
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def contains(self, request):
+        """Whether a live response is cached for a request, without counting a hit or miss."""
+        if not self.ttl:
+            return False
+        row = self.conn.execute("SELECT created FROM responses WHERE request_key = ?", (request_key(request),)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def put(self, request, response):
+        """Store a response (SDK object or JSON body) for a request."""
+        self.put_key(request_key(request), request.get("model"), response)
+
+    def put_key(self, key, model, response, commit=True):
+        """Store a response under an already computed request_key(); pass commit=False to batch writes."""
+        if not self.ttl:
+            return
+        body = response.model_dump(mode="json") if hasattr(response, "model_dump") else response
+        payload = json.dumps(body)
+        now = time.time()
+        previous = self.conn.execute("SELECT size FROM responses WHERE request_key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (request_key, model, value, size, created, last_access)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, payload, len(payload), now, now)
+        )
+        if commit:
+            self.conn.commit()
+        self.total_bytes += len(payload) - (previous[0] if previous else 0)
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def create(self, client, request, stage="completion"):
+        """client.chat.completions.create(**request), answered from the cache when possible."""
+        from openai.types.chat import ChatCompletion
+
+        cached = self.get(request)
+        if cached is not None:
+            telemetry.count(stage, "cache_hits")
+            return ChatCompletion.model_validate(cached)
+        with telemetry.span(stage):
+            response = client.chat.completions.create(**request)
+        telemetry.record_usage(stage, request.get("model"), response.usage)
+        self.put(request, response)
+        return response
+
+    def _evict(self):
+        # Expired entries go first, then the least recently used
+        self.conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self.total_bytes = evict_lru(self.conn, "responses", self.max_bytes)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        rate = f"{100 * self.hits / lookups:.0f}%" if lookups else "n/a"
+        return f"Response cache: {self.hits} hits, {self.misses} misses ({rate} hit rate), {self.total_bytes} bytes"
+
+    def close(self):
+        self.conn.close()
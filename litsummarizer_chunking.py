@@ -0,0 +1,79 @@
+import re
+from functools import lru_cache
+
+import tiktoken
+
+ENCODING_NAME = "o200k_base"
+
+# Paragraph breaks and section headings are preferred cut points, then sentence ends
+SECTION_BREAK = re.compile(r'\n\s*\n|\n(?=(?:\d+(?:\.\d+)*\.?|[IVX]+\.)\s+[A-Z])')
+SENTENCE_END = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=["\'(\[]?[A-Z0-9])')
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(encoding_name=ENCODING_NAME):
+    return tiktoken.get_encoding(encoding_name)
+
+
+def split_sentences(text):
+    """Split text into sentence-sized pieces, treating section breaks as hard boundaries."""
+    sentences = []
+    for section in SECTION_BREAK.split(text):
+        sentences.extend(s.strip() for s in SENTENCE_END.split(section) if s.strip())
+    return sentences
+
+
+def chunk_text(text, max_tokens, overlap_tokens=0, tokenizer=None):
+    """Split text into chunks of at most `max_tokens` tokens on sentence or section boundaries.
+
+    Consecutive chunks share up to `overlap_tokens` tokens of whole trailing sentences so an
+    argument spanning a cut is visible in both chunks. Sentences are tokenized in one batched
+    call; a single sentence longer than `max_tokens` is cut on token boundaries.
+    """
+    # A token is at least one character, so short texts never need tokenizing
+    if len(text) <= max_tokens:
+        return [text] if text.strip() else []
+
+    tokenizer = tokenizer or get_tokenizer()
+    sentences = split_sentences(text)
+    # Each piece is budgeted one extra token for the space it is joined with
+    pieces = []
+    for sentence, tokens in zip(sentences, tokenizer.encode_ordinary_batch(sentences)):
+        if len(tokens) < max_tokens:
+            pieces.append((sentence, len(tokens) + 1))
+        else:
+            for i in range(0, len(tokens), max_tokens - 1):
+                piece = tokens[i:i + max_tokens - 1]
+                pieces.append((tokenizer.decode(piece), len(piece) + 1))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece, n_tokens in pieces:
+        if current and current_tokens + n_tokens > max_tokens:
+            chunks.append(' '.join(p for p, _ in current))
+            # Carry whole trailing sentences into the next chunk, leaving room for this piece
+            carried = []
+            carried_tokens = 0
+            for prev, prev_tokens in reversed(current):
+                if carried_tokens + prev_tokens > overlap_tokens or carried_tokens + prev_tokens + n_tokens > max_tokens:
+                    break
+                carried.insert(0, (prev, prev_tokens))
+                carried_tokens += prev_tokens
+            current, current_tokens = carried, carried_tokens
+        current.append((piece, n_tokens))
+        current_tokens += n_tokens
+    if current:
+        chunks.append(' '.join(p for p, _ in current))
+    return chunks
+
+
+def reduce_prompt(question, answers):
+    """Prompt that condenses per-chunk answers to one question into a single answer."""
+    parts = "\n\n".join(f"Part {i}:\n{answer.strip()}" for i, answer in enumerate(answers, start=1))
+    return (
+        "The following answers to the same question were each written from a different, consecutive part "
+        "of one paper. Combine them into a single answer in the format the question asks for. Remove "
+        "repetition, keep every distinct point, and where parts disagree prefer the most specific one.\n\n"
+        f"Question: {question}\n\n{parts}"
+    )
@@ -0,0 +1,336 @@
+"""Run LitSummarizer without interactive prompts, from a shell, a scheduler or Python.
+
+    python litsummarizer_cli.py extract ./papers --text-dir ./texts
+    python litsummarizer_cli.py summarize ./papers -o papers.xlsx --prompts prompts.yaml --workers 8 --concurrency 32
+    python litsummarizer_cli.py batch submit ./papers --prompts prompts.yaml
+    python litsummarizer_cli.py batch poll              # exit status 75 while batches are still running
+    python litsummarizer_cli.py batch collect -o papers.xlsx
+    python litsummarizer_cli.py run ./papers -o papers.xlsx --deadline 2d --budget 5   # realtime or Batch API, whichever fits
+    python litsummarizer_cli.py ask --folder innovation=./papers --question "Which measures of innovation are used?"
+
+Sharded across processes or machines that share the queue, the PDFs and the results folder:
+
+    python litsummarizer_cli.py queue enqueue ./papers -o papers.xlsx --queue /shared/queue.sqlite --results /shared/results
+    python litsummarizer_cli.py queue work --queue /shared/queue.sqlite    # on every worker node
+    python litsummarizer_cli.py queue status --queue /shared/queue.sqlite
+    python litsummarizer_cli.py queue merge --queue /shared/queue.sqlite   # exit status 75 until every paper is done
+
+Every subcommand is a function here (extract_folder, summarize_folder, submit_batch, poll_batches,
+collect_batch, run_folder, ask, enqueue_folder, work_queue, queue_status, merge_queue) that scripts can import
+and call directly.
+"""
+import argparse
+import os
+import sys
+
+import litsummarizer_async
+import litsummarizer_extract
+from litsummarizer_jobs import STATE_FILE, BatchJobManager
+from litsummarizer_prompts import load_prompt_set
+from litsummarizer_telemetry import telemetry
+
+BATCH_INPUT_FILE = "batch_input.jsonl"
+QUEUE_FILE = "queue.sqlite"
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# Exit status of `batch poll` / `batch collect` / `queue merge` while work is still running (EX_TEMPFAIL)
+EXIT_PENDING = 75
+
+
+def configure(workers=None, concurrency=None, tokens_per_minute=None):
+    """Set how many PDFs are parsed at once and how many API requests are in flight, for this process."""
+    if workers is not None:
+        litsummarizer_extract.EXTRACT_WORKERS = workers
+    if concurrency is not None:
+        litsummarizer_async.MAX_CONCURRENCY = concurrency
+    if tokens_per_minute is not None:
+        litsummarizer_async.TOKENS_PER_MINUTE = tokens_per_minute
+
+
+def _pdf_files(folder_path):
+    return sorted(f for f in os.listdir(folder_path) if f.lower().endswith('.pdf'))
+
+
+def _prompt_set(prompts):
+    """A prompt set given as a file path or as an already loaded dict."""
+    return load_prompt_set(prompts) if isinstance(prompts, str) else prompts
+
+
+def extract_folder(folder_path, text_dir=None):
+    """Extract the text of every PDF in a folder into the cache, optionally also as <name>.txt files.
+
+    Returns {pdf_file: text, or None where extraction failed}.
+    """
+    # The pipeline modules create API clients, caches and tokenizers on import, so each
+    # subcommand imports only the one it needs
+    import litsummarizer
+
+    pdf_files = _pdf_files(folder_path)
+    documents = [(os.path.join(folder_path, f), litsummarizer.cache.document_key(os.path.join(folder_path, f)))
+                 for f in pdf_files]
+    texts = litsummarizer.extract_documents(documents)
+    results = {pdf_file: texts[doc_key] for pdf_file, (_, doc_key) in zip(pdf_files, documents)}
+    if text_dir:
+        os.makedirs(text_dir, exist_ok=True)
+        for pdf_file, text in results.items():
+            if text is not None:
+                with open(os.path.join(text_dir, f"{os.path.splitext(pdf_file)[0]}.txt"), 'w', encoding='utf-8') as f:
+                    f.write(text)
+    print(f"Extracted {sum(text is not None for text in results.values())}/{len(results)} PDFs.")
+    return results
+
+
+def summarize_folder(folder_path, output_path, prompts=None, mode=None):
+    """Summarize a folder into output_path with the realtime API (see litsummarizer.process_folder)."""
+    import litsummarizer
+
+    if prompts is not None:
+        litsummarizer.use_prompt_set(_prompt_set(prompts))
+    if mode is not None:
+        litsummarizer.SUMMARY_MODE = mode
+    return litsummarizer.process_folder(folder_path, output_path)
+
+
+def _batch_manager(state_path):
+    return BatchJobManager(os.environ.get("OPENAI_API_KEY"), state_path=state_path)
+
+
+def submit_batch(folder_path, jsonl_file=BATCH_INPUT_FILE, state_path=STATE_FILE, prompts=None):
+    """Prepare and submit Batch API jobs for a folder without waiting for them.
+
+    Returns the number of batches submitted, or None if there was nothing to submit. When state_path
+    still tracks an earlier run, only its parts that were never submitted are (usually none).
+    """
+    import litsummarizer_batchmode
+
+    if prompts is not None:
+        litsummarizer_batchmode.use_prompt_set(_prompt_set(prompts))
+    return litsummarizer_batchmode.submit_batches(folder_path, jsonl_file, _batch_manager(state_path))
+
+
+def poll_batches(state_path=STATE_FILE, wait=False):
+    """Poll every unfinished batch once (or, with wait, until all have finished); returns the number still running."""
+    manager = _batch_manager(state_path)
+    if wait:
+        manager.run()
+        return 0
+    running = manager.poll_once(force=True)
+    print(f"{running} of {len(manager.jobs)} batches still running.")
+    return running
+
+
+def collect_batch(output_path, jsonl_file=BATCH_INPUT_FILE, state_path=STATE_FILE, wait=False):
+    """Write the rows of finished batches to output_path.
+
+    Returns False if batches are still running (including the second batch that condenses
+    multi-chunk answers), None if state_path tracks no run to collect.
+    """
+    manager = _batch_manager(state_path)
+    if wait:
+        manager.run()
+    elif manager.active_jobs():
+        print(f"{len(manager.active_jobs())} batches are still running; poll them first or pass wait=True.")
+        return False
+
+    import litsummarizer_batchmode
+
+    collected = litsummarizer_batchmode.collect_batches(jsonl_file, output_path, manager)
+    while collected is False and wait:
+        manager.run()
+        collected = litsummarizer_batchmode.collect_batches(jsonl_file, output_path, manager)
+    if not collected:
+        return collected
+    print(litsummarizer_batchmode.response_cache.stats())
+    return True
+
+
+def run_folder(folder_path, output_path, deadline=None, budget=None, route="auto", prompts=None, mode=None,
+               dry_run=False):
+    """Summarize a folder with whichever API meets the deadline (seconds) and budget (USD) most cheaply.
+
+    Returns the route taken ("realtime" or "batch"), or None if neither fits. See litsummarizer_router.run_job.
+    """
+    import litsummarizer_router
+
+    return litsummarizer_router.run_job(folder_path, output_path, deadline, budget, route,
+                                        _prompt_set(prompts) if prompts is not None else None, mode, dry_run=dry_run)
+
+
+def ask(folder_info, questions, prompts=None, history_path="chat_history.jsonl"):
+    """Answer questions about folders ({label: folder_path}); returns [(question, answer), ...]."""
+    import litsummarizer
+
+    if prompts is not None:
+        litsummarizer.use_prompt_set(_prompt_set(prompts))
+    return list(litsummarizer.ask_folders(folder_info, questions, history_path))
+
+
+def enqueue_folder(folder_path, output_path, queue_path=QUEUE_FILE, results_dir=None, prompts=None):
+    """Queue a folder's new or changed PDFs for `work_queue` workers; returns the number queued."""
+    import litsummarizer_queue
+
+    results_dir = results_dir or f"{os.path.splitext(queue_path)[0]}_results"
+    return litsummarizer_queue.enqueue_folder(folder_path, output_path, queue_path, results_dir,
+                                              _prompt_set(prompts) if prompts is not None else None)
+
+
+def work_queue(queue_path=QUEUE_FILE, claim_size=None, worker=None):
+    """Summarize queued papers until none are left; returns how many this worker summarized."""
+    import litsummarizer_queue
+
+    return litsummarizer_queue.run_worker(queue_path, worker, claim_size or litsummarizer_queue.QUEUE_CLAIM_SIZE)
+
+
+def queue_status(queue_path=QUEUE_FILE):
+    """Number of queued papers per status (pending, claimed, done, failed)."""
+    from litsummarizer_queue import WorkQueue
+
+    queue = WorkQueue(queue_path)
+    counts = queue.counts()
+    queue.close()
+    print(', '.join(f"{count} {status}" for status, count in counts.items()))
+    return counts
+
+
+def merge_queue(queue_path=QUEUE_FILE):
+    """Write the workers' results to the workbook; returns the row count, or None while papers are unfinished."""
+    import litsummarizer_queue
+
+    return litsummarizer_queue.merge_results(queue_path)
+
+
+def _folder_arg(value):
+    label, sep, path = value.partition('=')
+    if not sep or not label or not path:
+        raise argparse.ArgumentTypeError(f"expected LABEL=PATH, got '{value}'")
+    return label, path
+
+
+def _duration_arg(value):
+    """Seconds from "90", "90s", "45m", "6h" or "2d"."""
+    number, unit = (value[:-1], value[-1]) if value[-1:] in DURATION_UNITS else (value, "s")
+    try:
+        return float(number) * DURATION_UNITS[unit]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a duration like 45m, 6h or 2d, got '{value}'")
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--workers", type=int, help="PDFs parsed in parallel (default: one per core)")
+    common.add_argument("--concurrency", type=int, help="API requests in flight at once (default 16)")
+    common.add_argument("--tokens-per-minute", type=int, help="token rate limit for realtime requests")
+    prompts = argparse.ArgumentParser(add_help=False)
+    prompts.add_argument("--prompts", help="YAML or JSON prompt set (system prompt and questions) to use")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", parents=[common], help="extract and cache the text of every PDF")
+    extract.add_argument("folder")
+    extract.add_argument("--text-dir", help="also write each paper's text to <name>.txt in this folder")
+
+    summarize = commands.add_parser("summarize", parents=[common, prompts], help="summarize a folder with the realtime API")
+    summarize.add_argument("folder")
+    summarize.add_argument("-o", "--output", help="workbook to write (default: <folder name>_summaries.xlsx)")
+    summarize.add_argument("--mode", choices=["per_prompt", "structured"], help="one request per question or per paper")
+
+    run = commands.add_parser("run", parents=[common, prompts], help="summarize a folder with the cheapest API that meets the deadline")
+    run.add_argument("folder")
+    run.add_argument("-o", "--output", help="workbook to write (default: <folder name>_summaries.xlsx)")
+    run.add_argument("--deadline", type=_duration_arg, help="when the results are needed, e.g. 45m, 6h, 2d (default: now)")
+    run.add_argument("--budget", type=float, help="most the run may cost, in USD")
+    run.add_argument("--route", choices=["auto", "realtime", "batch"], default="auto", help="force a route (default auto)")
+    run.add_argument("--mode", choices=["per_prompt", "structured"], help="one request per question or per paper")
+    run.add_argument("--dry-run", action="store_true", help="print the estimate and route without sending anything")
+
+    batch = commands.add_parser("batch", help="summarize a folder with the Batch API")
+    batch_commands = batch.add_subparsers(dest="batch_command", required=True)
+    state = argparse.ArgumentParser(add_help=False)
+    state.add_argument("--state", default=STATE_FILE, help=f"batch job state file (default {STATE_FILE})")
+    state.add_argument("--input", default=BATCH_INPUT_FILE, help=f"batch input file name (default {BATCH_INPUT_FILE})")
+    submit = batch_commands.add_parser("submit", parents=[common, prompts, state], help="prepare and submit batches")
+    submit.add_argument("folder")
+    poll = batch_commands.add_parser("poll", parents=[state], help="check on submitted batches")
+    poll.add_argument("--wait", action="store_true", help="keep polling until every batch has finished")
+    collect = batch_commands.add_parser("collect", parents=[common, state], help="write finished batches to a workbook")
+    collect.add_argument("-o", "--output", default="summarized_papers.xlsx")
+    collect.add_argument("--wait", action="store_true", help="wait for unfinished batches instead of exiting")
+
+    ask_parser = commands.add_parser("ask", parents=[common, prompts], help="answer questions about summarized folders")
+    ask_parser.add_argument("--folder", type=_folder_arg, action="append", required=True, metavar="LABEL=PATH")
+    ask_parser.add_argument("--question", action="append",
+                            help="question to answer (repeatable); without it, one question per line is read from stdin")
+    ask_parser.add_argument("--history", default="chat_history.jsonl")
+
+    queue = commands.add_parser("queue", help="summarize a folder with workers on several processes or machines")
+    queue_commands = queue.add_subparsers(dest="queue_command", required=True)
+    queue_file = argparse.ArgumentParser(add_help=False)
+    queue_file.add_argument("--queue", default=QUEUE_FILE, help=f"work queue database (default {QUEUE_FILE})")
+    enqueue = queue_commands.add_parser("enqueue", parents=[prompts, queue_file], help="queue new or changed PDFs")
+    enqueue.add_argument("folder")
+    enqueue.add_argument("-o", "--output", help="workbook to write (default: <folder name>_summaries.xlsx)")
+    enqueue.add_argument("--results", help="folder for per-paper results (default: <queue name>_results)")
+    work = queue_commands.add_parser("work", parents=[common, queue_file], help="summarize queued papers")
+    work.add_argument("--claim-size", type=int, help="papers claimed at a time (default 8)")
+    work.add_argument("--worker", help="worker name (default: host:pid)")
+    queue_commands.add_parser("status", parents=[queue_file], help="count queued papers by status")
+    queue_commands.add_parser("merge", parents=[queue_file], help="write finished results to the workbook")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    configure(getattr(args, "workers", None), getattr(args, "concurrency", None), getattr(args, "tokens_per_minute", None))
+    if getattr(args, "prompts", None):
+        try:
+            args.prompts = load_prompt_set(args.prompts)
+        except (OSError, ValueError, ImportError) as e:
+            parser.error(f"--prompts: {e}")
+
+    if args.command == "extract":
+        extract_folder(args.folder, args.text_dir)
+    elif args.command == "summarize":
+        output = args.output or f"{os.path.basename(os.path.normpath(args.folder))}_summaries.xlsx"
+        summarize_folder(args.folder, output, args.prompts, args.mode)
+    elif args.command == "run":
+        output = args.output or f"{os.path.basename(os.path.normpath(args.folder))}_summaries.xlsx"
+        route = run_folder(args.folder, output, args.deadline, args.budget, args.route, args.prompts, args.mode, args.dry_run)
+        if route is None:
+            return 1
+    elif args.command == "batch" and args.batch_command == "submit":
+        submitted = submit_batch(args.folder, args.input, args.state, args.prompts)
+        if submitted is None:
+            return 1
+        print(f"Submitted {submitted} batches; track them with 'batch poll --state {args.state}'.")
+    elif args.command == "batch" and args.batch_command == "poll":
+        if poll_batches(args.state, args.wait):
+            return EXIT_PENDING
+    elif args.command == "batch" and args.batch_command == "collect":
+        collected = collect_batch(args.output, args.input, args.state, args.wait)
+        if collected is None:
+            return 1
+        if not collected:
+            return EXIT_PENDING
+        telemetry.finish()
+    elif args.command == "ask":
+        questions = args.question or (line.strip() for line in sys.stdin if line.strip())
+        for question, answer in ask(dict(args.folder), questions, args.prompts, args.history):
+            print(f"Q: {question}\n{answer}\n")
+        telemetry.finish("Session summary", session=True)
+    elif args.command == "queue" and args.queue_command == "enqueue":
+        output = args.output or f"{os.path.basename(os.path.normpath(args.folder))}_summaries.xlsx"
+        queued = enqueue_folder(args.folder, output, args.queue, args.results, args.prompts)
+        print(f"Start workers with 'queue work --queue {args.queue}'." if queued else "Nothing to summarize; run 'queue merge'.")
+    elif args.command == "queue" and args.queue_command == "work":
+        work_queue(args.queue, args.claim_size, args.worker)
+    elif args.command == "queue" and args.queue_command == "status":
+        queue_status(args.queue)
+    elif args.command == "queue" and args.queue_command == "merge":
+        if merge_queue(args.queue) is None:
+            return EXIT_PENDING
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import zlib
+from collections import defaultdict
+
+# Papers whose estimated word-shingle Jaccard similarity reaches this are treated as one paper
+# (e.g. a preprint and its published version); 1 collapses only identical text, 0 turns dedup off
+DEDUP_THRESHOLD = float(os.environ.get("LITSUMMARIZER_DEDUP_THRESHOLD", 0.6))
+
+# Bump when the signature changes so cached signatures are recomputed
+DEDUP_VERSION = 2
+DEDUP_FIELD = f"dedup:v{DEDUP_VERSION}"
+
+SHINGLE_WORDS = 4
+NUM_HASHES = 128
+# 32 bands of 4 rows: pairs above ~0.6 similarity share a band with near certainty (99%), pairs
+# below ~0.2 almost never do, so only plausible duplicates are compared
+BANDS = 32
+# Shorter texts (failed or scanned extractions) are never matched: their digests would collide
+# across unrelated papers, e.g. every scanned PDF extracts to the same empty text
+MIN_SHINGLES = 200
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def text_signature(text):
+    """Exact digest and MinHash of a paper's text, as a JSON-serialisable dict.
+
+    Words are lowercased and stripped of punctuation first, so the same paper extracted with
+    different line breaks or spacing has the same digest. The MinHash uses one hash per
+    4-word shingle, binned into NUM_HASHES slots (one-permutation hashing), instead of
+    NUM_HASHES hashes per shingle. CRC-32 is stable across processes, so cached signatures stay
+    comparable, and several times cheaper than a cryptographic hash. Texts with fewer than
+    MIN_SHINGLES shingles get neither, so they are never deduplicated.
+    """
+    words = WORD.findall(text.lower())
+    shingles = set(map(' '.join, zip(*(words[i:] for i in range(SHINGLE_WORDS)))))
+    if len(shingles) < MIN_SHINGLES:
+        return {"digest": None, "minhash": None}
+    digest = hashlib.sha256(' '.join(words).encode('utf-8')).hexdigest()
+
+    slots = [None] * NUM_HASHES
+    for shingle in shingles:
+        h = zlib.crc32(shingle.encode('utf-8'))
+        slot, value = h % NUM_HASHES, h // NUM_HASHES
+        if slots[slot] is None or value < slots[slot]:
+            slots[slot] = value
+    # An empty slot borrows the next filled one, so every position stays comparable between papers
+    filled = [slot for slot in range(NUM_HASHES) if slots[slot] is not None]
+    for slot in range(NUM_HASHES):
+        if slots[slot] is None:
+            slots[slot] = slots[next((s for s in filled if s > slot), filled[0])]
+    return {"digest": digest, "minhash": slots}
+
+
+def similarity(minhash_a, minhash_b):
+    """Estimated Jaccard similarity of two papers' shingle sets."""
+    return sum(a == b for a, b in zip(minhash_a, minhash_b)) / len(minhash_a)
+
+
+class DuplicateIndex:
+    """LSH index over text signatures that maps each added paper onto an earlier copy, if any.
+
+    Exact copies are found by digest and near duplicates by banding the MinHash, so each add()
+    only compares against papers that share a band instead of against every paper so far.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, bands=BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_HASHES // bands
+        self.digests = {}
+        self.minhashes = {}
+        self.buckets = defaultdict(list)  # (band, values) -> keys
+
+    def add(self, key, signature):
+        """Return (earlier key, similarity) if `signature` duplicates an indexed paper.
+
+        Otherwise the paper is indexed under `key` and None is returned; duplicates are not
+        indexed themselves, so every copy maps onto the first one. Papers too short to sign
+        are neither matched nor indexed.
+        """
+        if self.threshold <= 0 or signature["digest"] is None:
+            return None
+        match = self.digests.get(signature["digest"])
+        if match is not None:
+            return match, 1.0
+
+        minhash = signature["minhash"]
+        bands = []
+        if self.threshold < 1:
+            bands = [(band, tuple(minhash[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+            best = None
+            compared = set()
+            for band in bands:
+                for candidate in self.buckets.get(band, ()):
+                    if candidate in compared:
+                        continue
+                    compared.add(candidate)
+                    score = similarity(minhash, self.minhashes[candidate])
+                    if score >= self.threshold and (best is None or score > best[1]):
+                        best = (candidate, score)
+            if best is not None:
+                return best
+
+        self.digests[signature["digest"]] = key
+        if bands:
+            self.minhashes[key] = minhash
+            for band in bands:
+                self.buckets[band].append(key)
+        return None
@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+
+import pdfminer
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LTTextContainer
+
+from litsummarizer_telemetry import telemetry
+
+EXTRACTOR_NAME = "pdfminer-pages"
+EXTRACTOR_VERSION = pdfminer.__version__
+
+# One worker per core by default; a PDF that takes longer than this to parse is abandoned
+EXTRACT_WORKERS = int(os.environ.get("LITSUMMARIZER_EXTRACT_WORKERS", os.cpu_count() or 1))
+EXTRACT_TIMEOUT = float(os.environ.get("LITSUMMARIZER_EXTRACT_TIMEOUT", 120))
+
+
+def page_text(page_layout):
+    return ''.join(element.get_text() for element in page_layout if isinstance(element, LTTextContainer))
+
+
+def extract_pdf_pages(file_path):
+    """Parse a PDF once and return the text of each page, in order."""
+    return [page_text(page_layout) for page_layout in extract_pages(file_path)]
+
+
+def _extract_worker(file_path, conn, extractor):
+    try:
+        conn.send((True, extractor(file_path)))
+    except Exception as e:
+        conn.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def extract_many(file_paths, workers=None, timeout=None, extractor=extract_pdf_pages, lookahead=None):
+    """Extract the pages of many PDFs in parallel, yielding (file_path, pages, error) as each finishes.
+
+    Every document is parsed in its own worker process so a PDF that hangs or crashes pdfminer
+    is killed after `timeout` seconds (or reported when it dies) without stalling the rest of
+    the run. Exactly one of `pages` and `error` is None. Each document's wall time is recorded
+    as an "extract" span. A different module-level `extractor` may be given; `pages` is then
+    whatever it returns. `workers` and `timeout` default to EXTRACT_WORKERS and EXTRACT_TIMEOUT
+    as set when the call is made. With `lookahead`, no document is started more than that many
+    places after the earliest one still being parsed, so a caller restoring file order holds
+    fewer than `lookahead` finished documents at a time.
+    """
+    workers = EXTRACT_WORKERS if workers is None else workers
+    timeout = EXTRACT_TIMEOUT if timeout is None else timeout
+    pending = list(reversed(list(enumerate(file_paths))))
+    running = {}  # receiving end of each worker's pipe -> (process, file_path, started, deadline)
+    positions = {}  # receiving end of each worker's pipe -> index of its document in file_paths
+
+    while pending or running:
+        while pending and len(running) < max(1, workers) and (
+                lookahead is None or not positions or pending[-1][0] < min(positions.values()) + lookahead):
+            position, file_path = pending.pop()
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_extract_worker, args=(file_path, sender, extractor),
+                                              daemon=True)
+            process.start()
+            sender.close()
+            started = time.monotonic()
+            running[receiver] = (process, file_path, started, started + timeout)
+            positions[receiver] = position
+
+        next_deadline = min(deadline for _, _, _, deadline in running.values())
+        for receiver in wait(list(running), timeout=max(0, next_deadline - time.monotonic())):
+            process, file_path, started, _ = running.pop(receiver)
+            del positions[receiver]
+            try:
+                ok, payload = receiver.recv()
+            except EOFError:
+                process.join()
+                ok, payload = False, f"extraction worker exited with code {process.exitcode}"
+            receiver.close()
+            process.join()
+            telemetry.record_duration("extract", time.monotonic() - started, error=None if ok else payload,
+                                      paper=os.path.basename(file_path))
+            yield (file_path, payload, None) if ok else (file_path, None, payload)
+
+        now = time.monotonic()
+        for receiver, (process, file_path, started, deadline) in list(running.items()):
+            if deadline <= now:
+                process.kill()
+                process.join()
+                receiver.close()
+                del running[receiver]
+                del positions[receiver]
+                error = f"extraction timed out after {timeout:g}s"
+                telemetry.record_duration("extract", now - started, error=error, paper=os.path.basename(file_path))
+                yield file_path, None, error
@@ -0,0 +1,94 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still single writes, just unlocked
+    fcntl = None
+
+HISTORY_FILE = "chat_history.jsonl"
+
+
+@contextmanager
+def _locked(f, exclusive):
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class HistoryStore:
+    """Append-only chat history in a JSONL file.
+
+    Each answer is one locked append, so concurrent sessions interleave instead of overwriting
+    each other, and recent() reads the file backwards only as far as its token budget needs.
+    A legacy chat_history.json next to the store is imported once on first use.
+    """
+
+    def __init__(self, path=HISTORY_FILE, legacy_path=None):
+        self.path = path
+        legacy_path = legacy_path or f"{os.path.splitext(path)[0]}.json"
+        if not os.path.exists(path) and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path)
+
+    def _import_legacy(self, legacy_path):
+        with open(legacy_path, 'r') as file:
+            legacy = json.load(file)
+        for question, answer in zip(legacy.get("questions", []), legacy.get("answers", [])):
+            self.append(question, answer)
+        print(f"Imported {len(legacy.get('questions', []))} turns from '{legacy_path}' into '{self.path}'.")
+
+    def append(self, question, answer):
+        line = json.dumps({"time": time.time(), "question": question, "answer": answer}) + "\n"
+        with open(self.path, 'a', encoding='utf-8') as f:
+            with _locked(f, exclusive=True):
+                f.write(line)
+                f.flush()
+
+    def _reversed_entries(self, block_size=1 << 16):
+        """Yield entries newest first, reading the file from the end in blocks."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            with _locked(f, exclusive=False):
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                buffer = b""
+                while position > 0:
+                    size = min(block_size, position)
+                    position -= size
+                    f.seek(position)
+                    buffer = f.read(size) + buffer
+                    lines = buffer.split(b"\n")
+                    buffer = lines.pop(0)
+                    for line in reversed(lines):
+                        if line.strip():
+                            yield json.loads(line)
+                if buffer.strip():
+                    yield json.loads(buffer)
+
+    def recent(self, token_budget, count_tokens, max_turns=None):
+        """The most recent turns, formatted as "Q: ...\\nA: ...", that fit in token_budget; oldest first."""
+        turns = []
+        used = 0
+        for entry in self._reversed_entries():
+            turn = f"Q: {entry['question']}\nA: {entry['answer']}"
+            used += count_tokens(turn)
+            if used > token_budget or (max_turns is not None and len(turns) >= max_turns):
+                break
+            turns.insert(0, turn)
+        return "\n".join(turns)
+
+    def load(self):
+        """The whole history in the legacy {"questions": [...], "answers": [...]} shape."""
+        entries = list(self._reversed_entries())[::-1]
+        return {
+            "questions": [entry["question"] for entry in entries],
+            "answers": [entry["answer"] for entry in entries],
+        }
@@ -0,0 +1,84 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how in is it its of on or that the "
+    "their there these they this to was were what when which who why will with".split()
+)
+
+
+def tokenize(text):
+    return [word for word in WORD.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+def passages(text, words=200, overlap=50):
+    """Split text into overlapping windows of roughly `words` words for passage-level retrieval."""
+    tokens = text.split()
+    step = max(1, words - overlap)
+    return [' '.join(tokens[i:i + words]) for i in range(0, max(len(tokens) - overlap, 1), step)]
+
+
+class PaperIndex:
+    """Local BM25 index over paper summaries and text passages.
+
+    Everything is computed in memory from text already on disk, so building and querying
+    the index never touches the network.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.doc_lengths = []
+        self.docs = []  # doc_id -> (paper_id, kind, text)
+        self.paper_ids = []
+
+    def add(self, paper_id, text, kind="passage"):
+        """Index one document (a summary or a passage) belonging to paper_id."""
+        if paper_id not in self.paper_ids:
+            self.paper_ids.append(paper_id)
+        doc_id = len(self.docs)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+        self.doc_lengths.append(sum(terms.values()))
+        self.docs.append((paper_id, kind, text))
+
+    def search(self, query, k=10):
+        """Return the top-k (score, doc_id) pairs for a query."""
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_length = sum(self.doc_lengths) / n_docs or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, ((score, doc_id) for doc_id, score in scores.items()))
+
+    def search_papers(self, query, k=10, passages_per_paper=2):
+        """Rank papers by their best-matching document.
+
+        Returns [(paper_id, score, [passage text, ...])] for the top-k papers. When nothing in
+        the query matches, the first k papers are returned with no passages so the caller still
+        has something to work with.
+        """
+        best = {}
+        matched = defaultdict(list)
+        for score, doc_id in self.search(query, k=len(self.docs)):
+            paper_id, kind, text = self.docs[doc_id]
+            best.setdefault(paper_id, score)
+            if kind == "passage" and len(matched[paper_id]) < passages_per_paper:
+                matched[paper_id].append(text)
+        if not best:
+            return [(paper_id, 0.0, []) for paper_id in self.paper_ids[:k]]
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(paper_id, score, matched[paper_id]) for paper_id, score in ranked]
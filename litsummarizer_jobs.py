@@ -0,0 +1,300 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from litsummarizer_cache import atomic_write_json
+from litsummarizer_telemetry import telemetry
+
+API_BASE = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+STATE_FILE = "batch_jobs.json"
+OUTPUT_DIR = "batch_outputs"
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Polling starts fast and backs off while a batch's status doesn't change
+MIN_POLL_INTERVAL = 30
+MAX_POLL_INTERVAL = 600
+MAX_RESUBMITS = 2
+# A cancelled batch keeps the answers it already has; wait this long for it to stop and return them
+CANCEL_POLL_INTERVAL = 5
+CANCEL_TIMEOUT = 600
+
+
+class BatchJobManager:
+    """Submits, polls and collects many Batch API jobs, persisting every step to a state file.
+
+    The state file is rewritten after each change, so a crashed or interrupted run picks up
+    where it left off: jobs are polled again, finished outputs are not re-downloaded and
+    requests that failed or expired are resubmitted (at most `max_resubmits` times).
+    """
+
+    def __init__(self, api_key, state_path=STATE_FILE, output_dir=OUTPUT_DIR, api_base=API_BASE,
+                 max_resubmits=MAX_RESUBMITS, max_workers=8):
+        self.api_key = api_key
+        self.state_path = state_path
+        self.output_dir = output_dir
+        self.api_base = api_base.rstrip('/')
+        self.max_resubmits = max_resubmits
+        self.max_workers = max_workers
+        self.jobs = {}
+        # Prepared input files, in order; any without a job yet still have to be submitted
+        self.inputs = []
+        # Describes the run the batches belong to, so a resumed run can tell they are its own
+        self.run_info = {}
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+            self.jobs = state["jobs"]
+            self.inputs = state.get("inputs", [])
+            self.run_info = state.get("run", {})
+
+    def _headers(self):
+        return {'Authorization': f'Bearer {self.api_key}'}
+
+    def _save(self):
+        atomic_write_json(self.state_path, {"jobs": self.jobs, "inputs": self.inputs, "run": self.run_info}, indent=4)
+
+    def active_jobs(self):
+        return [batch_id for batch_id, job in self.jobs.items() if not job.get("collected")]
+
+    def upload(self, jsonl_path):
+        """Upload a batch input file and return its file ID."""
+        with open(jsonl_path, 'rb') as f:
+            response = requests.post(
+                f"{self.api_base}/files", headers=self._headers(),
+                files={"file": (os.path.basename(jsonl_path), f)}, data={"purpose": "batch"}
+            )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def add_inputs(self, jsonl_paths):
+        """Record prepared batch input files before submitting them, so an interrupted submission can be finished."""
+        self.inputs.extend(jsonl_paths)
+        self._save()
+
+    def pending_inputs(self):
+        """Recorded input files, and written resubmissions of failed requests, that have no batch yet."""
+        submitted = {job["input_path"] for job in self.jobs.values()}
+        retries = [job["retry_path"] for job in self.jobs.values() if job.get("retry_path")]
+        return [path for path in self.inputs + retries if path not in submitted]
+
+    def submit_inputs(self):
+        """Submit every recorded input file and resubmission that has no batch yet; returns how many were submitted."""
+        missing = self.pending_inputs()
+        retries = self._retries()
+        for path in missing:
+            if path in retries:
+                self._submit_retry(retries[path])
+            else:
+                self.submit(path)
+        return len(missing)
+
+    def _retries(self):
+        """{retry_path: batch_id} of the finished batches whose failed requests were written out for resubmission."""
+        return {job["retry_path"]: batch_id for batch_id, job in self.jobs.items() if job.get("retry_path")}
+
+    def _submit_retry(self, batch_id):
+        job = self.jobs[batch_id]
+        job["resubmitted_as"] = self.submit(job["retry_path"], attempt=job["attempt"] + 1)
+        self._save()
+
+    def clear(self):
+        """Forget every job, input and the run description, deleting the state file (once a run's results are written)."""
+        self.jobs, self.inputs, self.run_info = {}, [], {}
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def submit(self, jsonl_path, attempt=0):
+        """Upload and submit one batch input file, recording it in the state file."""
+        with telemetry.span("upload", path=jsonl_path):
+            file_id = self.upload(jsonl_path)
+        response = requests.post(
+            f"{self.api_base}/batches", headers=self._headers(),
+            json={
+                "input_file_id": file_id,
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+                "metadata": {"description": "Summarize research papers batch job"}
+            }
+        )
+        response.raise_for_status()
+        batch_id = response.json()["id"]
+        self.jobs[batch_id] = {
+            "input_path": jsonl_path,
+            "input_file_id": file_id,
+            "status": "validating",
+            "attempt": attempt,
+            "submitted_at": time.time(),
+            "poll_interval": MIN_POLL_INTERVAL,
+            "next_poll": 0,
+            "output_path": None,
+            "error_path": None,
+            "collected": False,
+        }
+        self._save()
+        print(f"Batch job created with ID: {batch_id} ({jsonl_path})")
+        return batch_id
+
+    def _download(self, file_id, path):
+        with requests.get(f"{self.api_base}/files/{file_id}/content", headers=self._headers(), stream=True) as response:
+            response.raise_for_status()
+            with open(path, 'wb') as f:
+                for block in response.iter_content(chunk_size=1 << 20):
+                    f.write(block)
+        return path
+
+    def _refresh(self, batch_id):
+        """Fetch one batch's status and, once it has finished, download its output and error files."""
+        response = requests.get(f"{self.api_base}/batches/{batch_id}", headers=self._headers())
+        response.raise_for_status()
+        batch = response.json()
+        paths = {}
+        if batch["status"] in TERMINAL_STATUSES:
+            os.makedirs(self.output_dir, exist_ok=True)
+            for kind in ("output", "error"):
+                file_id = batch.get(f"{kind}_file_id")
+                if file_id:
+                    paths[kind] = self._download(file_id, os.path.join(self.output_dir, f"{batch_id}_{kind}.jsonl"))
+        return batch, paths
+
+    def poll_once(self, force=False):
+        """Poll every due (with force, every) unfinished batch concurrently; returns the number still running."""
+        # Resubmissions written out just before the previous run was interrupted
+        retries = self._retries()
+        for path in self.pending_inputs():
+            if path in retries:
+                self._submit_retry(retries[path])
+
+        now = time.time()
+        due = [batch_id for batch_id in self.active_jobs() if force or self.jobs[batch_id]["next_poll"] <= now]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {batch_id: executor.submit(self._refresh, batch_id) for batch_id in due}
+
+        for batch_id, future in futures.items():
+            job = self.jobs[batch_id]
+            telemetry.count("batch", "polls", batch=batch_id)
+            try:
+                batch, paths = future.result()
+            except Exception as e:
+                print(f"Exception occurred while checking batch {batch_id}: {e}")
+                self._back_off(job)
+                continue
+
+            if batch["status"] != job["status"]:
+                print(f"Batch {batch_id} status: {batch['status']}")
+                job["status"] = batch["status"]
+                job["poll_interval"] = MIN_POLL_INTERVAL
+                job["next_poll"] = time.time() + job["poll_interval"]
+            else:
+                self._back_off(job)
+
+            if job["status"] in TERMINAL_STATUSES:
+                if job.get("submitted_at"):
+                    # Time from submission until the finished batch was noticed and downloaded
+                    telemetry.record_duration("batch", time.time() - job["submitted_at"], batch=batch_id,
+                                              status=job["status"], attempt=job["attempt"])
+                job["output_path"] = paths.get("output")
+                job["error_path"] = paths.get("error")
+                self._resubmit_failures(batch_id)
+                job["collected"] = True
+            self._save()
+
+        return len(self.active_jobs())
+
+    def _back_off(self, job):
+        job["poll_interval"] = min(job["poll_interval"] * 2, MAX_POLL_INTERVAL)
+        job["next_poll"] = time.time() + job["poll_interval"]
+
+    def _resubmit_failures(self, batch_id):
+        """Resubmit the requests of a finished batch that have no successful response."""
+        job = self.jobs[batch_id]
+        succeeded = set()
+        if job["output_path"]:
+            with open(job["output_path"], 'r') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    response = entry.get("response") or {}
+                    if response.get("status_code") == 200:
+                        succeeded.add(entry["custom_id"])
+
+        stem, ext = os.path.splitext(job["input_path"])
+        retry_path = f"{stem.split('.retry')[0]}.retry{job['attempt'] + 1}{ext}"
+        retried = 0
+        with open(job["input_path"], 'r') as src, open(retry_path, 'w') as dst:
+            for line in src:
+                if json.loads(line)["custom_id"] not in succeeded:
+                    dst.write(line)
+                    retried += 1
+
+        if not retried:
+            os.remove(retry_path)
+            return
+        if job["attempt"] >= self.max_resubmits:
+            print(f"Batch {batch_id}: {retried} requests failed and the resubmit limit is reached.")
+            os.remove(retry_path)
+            return
+        print(f"Batch {batch_id} ({job['status']}): resubmitting {retried} failed requests.")
+        telemetry.count("batch", "retries", retried, batch=batch_id, status=job["status"])
+        # Saved as collected before submitting, so an interrupted run submits the retry file on
+        # resume instead of finding this batch unfinished and resubmitting its failures again
+        job["retry_path"] = retry_path
+        job["collected"] = True
+        self._save()
+        self._submit_retry(batch_id)
+
+    def run(self):
+        """Poll until every batch, including resubmissions, has finished and been downloaded."""
+        while self.poll_once():
+            next_poll = min(self.jobs[batch_id]["next_poll"] for batch_id in self.active_jobs())
+            time.sleep(max(0, next_poll - time.time()))
+
+    def cancel_active(self, timeout=CANCEL_TIMEOUT):
+        """Cancel every unfinished batch and download what each finished before it stopped.
+
+        Requests a batch answered before the cancellation are billed, so their output is kept;
+        the rest are not resubmitted. Batches still cancelling after `timeout` seconds are given up on.
+        """
+        cancelling = self.active_jobs()
+        for batch_id in cancelling:
+            try:
+                response = requests.post(f"{self.api_base}/batches/{batch_id}/cancel", headers=self._headers())
+                response.raise_for_status()
+                print(f"Batch {batch_id} cancelling.")
+            except Exception as e:
+                print(f"Exception occurred while cancelling batch {batch_id}: {e}")
+            self.jobs[batch_id]["status"] = "cancelling"
+        self._save()
+
+        give_up = time.time() + timeout
+        while cancelling:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {batch_id: executor.submit(self._refresh, batch_id) for batch_id in cancelling}
+            for batch_id, future in futures.items():
+                try:
+                    batch, paths = future.result()
+                except Exception as e:
+                    print(f"Exception occurred while checking batch {batch_id}: {e}")
+                    continue
+                if batch["status"] in TERMINAL_STATUSES:
+                    print(f"Batch {batch_id} status: {batch['status']}")
+                    self.jobs[batch_id].update(status=batch["status"], output_path=paths.get("output"),
+                                               error_path=paths.get("error"), collected=True)
+                    cancelling.remove(batch_id)
+            if cancelling and time.time() >= give_up:
+                print(f"{len(cancelling)} batches are still cancelling; their answers are not collected.")
+                for batch_id in cancelling:
+                    self.jobs[batch_id]["collected"] = True
+                cancelling = []
+            self._save()
+            if cancelling:
+                time.sleep(CANCEL_POLL_INTERVAL)
+
+    def output_files(self):
+        """Downloaded output files of all finished batches, in submission order."""
+        return [job["output_path"] for job in self.jobs.values() if job.get("output_path")]
+
+    def error_files(self):
+        return [job["error_path"] for job in self.jobs.values() if job.get("error_path")]
@@ -0,0 +1,178 @@
+import datetime
+import re
+from collections import Counter
+
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LTChar, LTTextContainer, LTTextLine
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+from pdfminer.utils import decode_text
+
+from litsummarizer_extract import page_text
+from litsummarizer_text import clean_text_for_excel
+
+# Bump when the heuristics change so cached local results are recomputed
+METADATA_VERSION = 1
+LOCAL_METADATA_FIELD = f"local_metadata:v{METADATA_VERSION}"
+
+DOI_RE = re.compile(r'\b(10\.\d{4,9}/[^\s"<>]+[^\s"<>.,;)\]])', re.IGNORECASE)
+ARXIV_RE = re.compile(r'\barXiv:\s*(\d{2})(\d{2})\.(\d{4,5})(v\d+)?', re.IGNORECASE)
+# A year next to one of these words is a publication year, not a citation
+DATED_YEAR_RE = re.compile(
+    r'(?:published|copyright|©|\(c\)|received|accepted|available online|journal|proceedings|vol\.?|volume)'
+    r'[^\n]{0,40}?\b(19[5-9]\d|20\d\d)\b', re.IGNORECASE
+)
+JUNK_TITLE_RE = re.compile(r'^(untitled|microsoft word|title|document\d*)\b|\.(docx?|pdf|tex|dvi)$', re.IGNORECASE)
+NOT_AUTHOR_RE = re.compile(
+    r'\b(abstract|university|department|institute|school|college|journal|introduction|keywords|working paper'
+    r'|@|http|www\.|vol\.|january|february|march|april|may|june|july|august|september|october|november|december)\b',
+    re.IGNORECASE
+)
+NAME_PARTICLES = {"de", "van", "von", "der", "den", "da", "di", "du", "la", "le", "del", "dos", "bin", "al"}
+
+
+def pdf_info(file_path):
+    """The PDF's Info dictionary (Title, Author, CreationDate, ...) as decoded strings."""
+    with open(file_path, 'rb') as f:
+        document = PDFDocument(PDFParser(f))
+        info = {}
+        for entry in document.info:
+            for key, value in entry.items():
+                value = resolve1(value)
+                if isinstance(value, bytes):
+                    value = decode_text(value)
+                if isinstance(value, str) and value.strip():
+                    info[key] = value.strip()
+        return info
+
+
+def _line_size(line):
+    sizes = [round(char.size, 1) for char in line if isinstance(char, LTChar)]
+    return Counter(sizes).most_common(1)[0][0] if sizes else 0
+
+
+def first_page_lines(page_layout):
+    """(font size, text) for every text line of a page, top to bottom."""
+    lines = []
+    for element in page_layout:
+        if not isinstance(element, LTTextContainer):
+            continue
+        for line in element:
+            if isinstance(line, LTTextLine) and line.get_text().strip():
+                lines.append((-line.y1, line.x0, _line_size(line), ' '.join(line.get_text().split())))
+    return [(size, text) for _, _, size, text in sorted(lines)]
+
+
+def _title_from_layout(lines):
+    """The run of largest-font lines near the top of page 0, and the lines after it."""
+    body_sizes = Counter(size for size, text in lines for _ in text.split())
+    if not body_sizes:
+        return None, []
+    body_size = body_sizes.most_common(1)[0][0]
+    candidates = [(size, text) for size, text in lines[:30] if re.search(r'[A-Za-z]{3}', text)]
+    if not candidates:
+        return None, []
+    title_size = max(size for size, _ in candidates)
+    if title_size < body_size * 1.15:
+        return None, []
+    start = next(i for i, (size, text) in enumerate(lines) if size == title_size and re.search(r'[A-Za-z]{3}', text))
+    end = start
+    while end + 1 < len(lines) and lines[end + 1][0] == title_size:
+        end += 1
+    title = ' '.join(text for _, text in lines[start:end + 1])
+    return title, lines[end + 1:end + 4]
+
+
+def _looks_like_authors(text):
+    """"A. Smith1, B. Chen* and C. Garcia" -> "A. Smith, B. Chen, C. Garcia"; None if it isn't a list of names."""
+    text = re.sub(r'[*†‡§¶]|\d+', '', text)  # footnote and affiliation markers
+    if NOT_AUTHOR_RE.search(text) or len(text) > 300:
+        return None
+    names = [' '.join(name.split()) for name in re.split(r',|;|\band\b|&', text) if name.strip()]
+    if not names or any(not 2 <= len(name.split()) <= 5 for name in names):
+        return None
+    for word in (word for name in names for word in name.split()):
+        if not (word[0].isalpha() and word[0].isupper()) and word.lower() not in NAME_PARTICLES:
+            return None
+    return ', '.join(names)
+
+
+def _clean_field(text):
+    """A title or author string on one line without control characters (which openpyxl rejects), or None."""
+    if not text:
+        return None
+    return clean_text_for_excel(' '.join(text.split())) or None
+
+
+def _valid_title(title):
+    return title and 3 <= len(title.split()) <= 40 and not JUNK_TITLE_RE.search(title.strip())
+
+
+def local_metadata(lines, info, text):
+    """Title, authors and year from the Info dictionary and page 0's lines, plus DOI/arXiv IDs.
+
+    Returns a dict with "confident" set when all three fields were found with good evidence;
+    otherwise the caller should ask the model.
+    """
+    layout_title, after_title = _title_from_layout(lines)
+    # Info dictionaries and page text can carry control characters; clean before validating
+    info_title, layout_title = _clean_field(info.get("Title")), _clean_field(layout_title)
+
+    title = info_title if _valid_title(info_title) else None
+    if title is None and _valid_title(layout_title):
+        title = layout_title
+
+    authors = None
+    for _, line in after_title:
+        authors = _looks_like_authors(line)
+        if authors:
+            break
+    if authors is None and info.get("Author") and _looks_like_authors(info["Author"]):
+        authors = _looks_like_authors(info["Author"])
+
+    doi = DOI_RE.search(text)
+    arxiv = ARXIV_RE.search(text)
+    year = None
+    if arxiv:
+        year = 2000 + int(arxiv.group(1))
+    else:
+        dated = DATED_YEAR_RE.search(text)
+        if dated and int(dated.group(1)) <= datetime.date.today().year + 1:
+            year = int(dated.group(1))
+
+    return {
+        "title": title,
+        "authors": _clean_field(authors),
+        "year": year,
+        "doi": doi.group(1) if doi else None,
+        "arxiv": f"{arxiv.group(1)}{arxiv.group(2)}.{arxiv.group(3)}" if arxiv else None,
+        "confident": bool(title and authors and year),
+    }
+
+
+def extract_pages_and_metadata(file_path):
+    """extract_pdf_pages() plus local_metadata(), from the same single parse of the PDF."""
+    pages = []
+    lines = []
+    for page_layout in extract_pages(file_path):
+        if not pages:
+            lines = first_page_lines(page_layout)
+        pages.append(page_text(page_layout))
+    try:
+        info = pdf_info(file_path)
+    except Exception:
+        info = {}
+    return {"pages": pages, "metadata": local_metadata(lines, info, pages[0] if pages else "")}
+
+
+def extract_local_metadata(file_path):
+    """local_metadata() for a single PDF, parsing only its first page."""
+    first_layout = next(iter(extract_pages(file_path, maxpages=1)), None)
+    try:
+        info = pdf_info(file_path)
+    except Exception:
+        info = {}
+    if first_layout is None:
+        return local_metadata([], info, "")
+    return local_metadata(first_page_lines(first_layout), info, page_text(first_layout))
@@ -0,0 +1,192 @@
+import csv
+import json
+import os
+
+from openpyxl import Workbook
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet output is optional
+    pyarrow = None
+
+# Extra formats written next to every .xlsx, e.g. "csv,jsonl,parquet"; rows reach these as soon as
+# they are written, while the workbook itself is only complete once the run finishes
+EXTRA_OUTPUT_FORMATS = [f.strip() for f in os.environ.get("LITSUMMARIZER_OUTPUT_FORMATS", "").split(",") if f.strip()]
+
+EXCEL_CELL_LIMIT = 32767
+OVERFLOW_SHEET = "Overflow"
+PARQUET_ROW_GROUP = 1000
+
+
+class RowWriter:
+    """Base class for streaming output writers: write() rows one at a time, then close().
+
+    The column order is taken from the first row unless given; with columns, the file (and its
+    header) is created even if no rows follow.
+    """
+
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = None if columns is None else list(columns)
+        self.rows = 0
+        if self.columns is not None:
+            self._start()
+
+    def write(self, row):
+        if self.columns is None:
+            self.columns = list(row)
+            self._start()
+        self._write([row.get(column) for column in self.columns])
+        self.rows += 1
+
+    def _start(self):
+        pass
+
+    def _write(self, values):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CSVWriter(RowWriter):
+    def _start(self):
+        self.file = open(self.path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+
+    def _write(self, values):
+        self.writer.writerow(values)
+        self.file.flush()
+
+    def close(self):
+        if self.columns is not None:
+            self.file.close()
+
+
+class JSONLWriter(RowWriter):
+    def _start(self):
+        self.file = open(self.path, 'w', encoding='utf-8')
+
+    def _write(self, values):
+        self.file.write(json.dumps(dict(zip(self.columns, values)), ensure_ascii=False, default=str) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.columns is not None:
+            self.file.close()
+
+
+class ParquetWriter(RowWriter):
+    """Buffers rows into row groups of PARQUET_ROW_GROUP; every value is stored as a string."""
+
+    def __init__(self, path, columns=None):
+        if pyarrow is None:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow)")
+        self.buffer = []
+        self.writer = None
+        super().__init__(path, columns)
+
+    def _start(self):
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in self.columns])
+        self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+    def _write(self, values):
+        self.buffer.append(["" if value is None else str(value) for value in values])
+        if len(self.buffer) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            columns = list(zip(*self.buffer))
+            self.writer.write_table(pyarrow.table(
+                {name: pyarrow.array(values, pyarrow.string()) for name, values in zip(self.columns, columns)},
+                schema=self.schema
+            ))
+            self.buffer = []
+
+    def close(self):
+        if self.writer is not None:
+            self._flush()
+            self.writer.close()
+
+
+class XLSXWriter(RowWriter):
+    """Write-only openpyxl workbook; rows go to a temporary file instead of being held in memory.
+
+    Cells longer than Excel's 32,767-character limit are cut at the limit with a pointer to the
+    "Overflow" sheet, which holds the rest of the text as (row, column, part, text) records.
+    """
+
+    def _start(self):
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Sheet1")
+        self.sheet.append(self.columns)
+        self.overflow = None
+
+    def _write(self, values):
+        excel_row = self.rows + 2  # after the header, 1-based
+        self.sheet.append([
+            self._fit(value, excel_row, column) if isinstance(value, str) and len(value) > EXCEL_CELL_LIMIT else value
+            for column, value in zip(self.columns, values)
+        ])
+
+    def _fit(self, value, excel_row, column):
+        if self.overflow is None:
+            self.overflow = self.workbook.create_sheet(OVERFLOW_SHEET)
+            self.overflow.append(["Row", "Column", "Part", "Text"])
+        marker = f" [continued in sheet '{OVERFLOW_SHEET}']"
+        head = EXCEL_CELL_LIMIT - len(marker)
+        rest = value[head:]
+        for part, start in enumerate(range(0, len(rest), EXCEL_CELL_LIMIT), start=1):
+            self.overflow.append([excel_row, column, part, rest[start:start + EXCEL_CELL_LIMIT]])
+        return value[:head] + marker
+
+    def close(self):
+        if self.columns is not None:
+            self.workbook.save(self.path)
+
+
+WRITERS = {
+    ".xlsx": XLSXWriter,
+    ".csv": CSVWriter,
+    ".jsonl": JSONLWriter,
+    ".parquet": ParquetWriter,
+}
+
+
+def output_paths_for(output_path, formats=None):
+    """The requested output plus one file per extra format with the same name, e.g. x.xlsx, x.jsonl."""
+    stem, ext = os.path.splitext(output_path)
+    formats = EXTRA_OUTPUT_FORMATS if formats is None else formats
+    return [output_path] + [f"{stem}.{fmt.lstrip('.')}" for fmt in formats if f".{fmt.lstrip('.')}" != ext]
+
+
+def open_writer(path, columns=None):
+    """Pick the writer for a path by its extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in WRITERS:
+        raise ValueError(f"Unsupported output format '{ext}' (use one of {', '.join(WRITERS)})")
+    return WRITERS[ext](path, columns)
+
+
+def write_rows(rows, paths, columns=None):
+    """Stream rows (any iterable of dicts) to every path at once; returns the number of rows written."""
+    writers = [open_writer(path, columns) for path in paths]
+    try:
+        count = 0
+        for row in rows:
+            for writer in writers:
+                writer.write(row)
+            count += 1
+        return count
+    finally:
+        for writer in writers:
+            writer.close()
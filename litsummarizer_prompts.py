@@ -0,0 +1,47 @@
+import json
+import os
+
+try:
+    import yaml
+except ImportError:  # YAML prompt sets are optional; JSON always works
+    yaml = None
+
+
+def load_prompt_set(path):
+    """Read a prompt set from a .yaml/.yml or .json file.
+
+    The file holds the questions as {column name: prompt}, in output column order, and
+    optionally the system prompt:
+
+        system: You are an experienced research assistant ...
+        questions:
+          Research Question: Summarize the primary research question of the paper.
+          Key Findings: Summarize the key findings of the paper in three sentences.
+
+    Returns {"system": str or None, "questions": {column: prompt}}.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8') as f:
+        if ext in (".yaml", ".yml"):
+            if yaml is None:
+                raise ImportError("YAML prompt sets need PyYAML (pip install pyyaml); JSON files work without it")
+            data = yaml.safe_load(f)
+        elif ext == ".json":
+            data = json.load(f)
+        else:
+            raise ValueError(f"Unsupported prompt set format '{ext}' (use .yaml, .yml or .json)")
+
+    if not isinstance(data, dict) or not isinstance(data.get("questions"), dict) or not data["questions"]:
+        raise ValueError(f"{path}: a prompt set needs a non-empty 'questions' mapping of column name to prompt")
+    unknown = set(data) - {"system", "questions"}
+    if unknown:
+        raise ValueError(f"{path}: unknown keys {', '.join(sorted(unknown))}")
+    questions = {}
+    for column, prompt in data["questions"].items():
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError(f"{path}: the prompt for '{column}' must be non-empty text")
+        questions[str(column)] = prompt.strip()
+    system = data.get("system")
+    if system is not None and (not isinstance(system, str) or not system.strip()):
+        raise ValueError(f"{path}: 'system' must be non-empty text")
+    return {"system": system.strip() if system else None, "questions": questions}
@@ -0,0 +1,302 @@
+import json
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from litsummarizer_cache import atomic_write_json
+from litsummarizer_telemetry import telemetry
+
+# A claimed paper whose worker has sent no heartbeat for this many seconds goes back to the queue
+QUEUE_LEASE = float(os.environ.get("LITSUMMARIZER_QUEUE_LEASE", 300))
+# Papers a worker claims at a time; their extraction and requests run concurrently
+QUEUE_CLAIM_SIZE = int(os.environ.get("LITSUMMARIZER_QUEUE_CLAIM_SIZE", 8))
+# A paper is given up after this many claims (worker crashes or errors while processing it)
+MAX_ATTEMPTS = 3
+
+
+class WorkQueue:
+    """SQLite queue of papers shared by any number of worker processes, on one machine or several.
+
+    Workers claim pending papers under a lease that their heartbeats keep alive. Papers whose
+    lease runs out because the worker crashed or lost its machine go back to pending on the next
+    claim, until they have been tried `max_attempts` times. Claims run in an IMMEDIATE
+    transaction, so no two workers get the same paper. The database uses SQLite's rollback
+    journal rather than WAL, so it also works on a shared file system with working file locks.
+    """
+
+    def __init__(self, path, lease=QUEUE_LEASE, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        # Autocommit; claims and other multi-statement updates open their own transactions
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " pdf_file TEXT PRIMARY KEY,"
+            " path TEXT NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " worker TEXT,"
+            " heartbeat REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT,"
+            " error TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_status ON items (status)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def reset(self, items, settings):
+        """Replace the queue's contents with [(pdf_file, path, digest), ...] and the run's settings."""
+        with self._transaction():
+            self.conn.execute("DELETE FROM items")
+            self.conn.execute("DELETE FROM settings")
+            self.conn.executemany(
+                "INSERT INTO items (pdf_file, path, digest, status) VALUES (?, ?, ?, 'pending')", items
+            )
+            self.conn.executemany(
+                "INSERT INTO settings (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in settings.items()]
+            )
+
+    def settings(self):
+        return {key: json.loads(value) for key, value in self.conn.execute("SELECT key, value FROM settings")}
+
+    def claim(self, worker, limit=1):
+        """Reclaim expired leases, then claim up to `limit` pending papers; returns [(pdf_file, path, digest)]."""
+        now = time.time()
+        with self._transaction():
+            self.conn.execute(
+                "UPDATE items SET status = 'failed', error = 'worker stopped responding', worker = NULL"
+                " WHERE status = 'claimed' AND heartbeat < ? AND attempts >= ?",
+                (now - self.lease, self.max_attempts)
+            )
+            reclaimed = self.conn.execute(
+                "UPDATE items SET status = 'pending', worker = NULL WHERE status = 'claimed' AND heartbeat < ?",
+                (now - self.lease,)
+            ).rowcount
+            items = self.conn.execute(
+                "SELECT pdf_file, path, digest FROM items WHERE status = 'pending' ORDER BY pdf_file LIMIT ?", (limit,)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE items SET status = 'claimed', worker = ?, heartbeat = ?, attempts = attempts + 1"
+                " WHERE pdf_file = ?",
+                [(worker, now, pdf_file) for pdf_file, _, _ in items]
+            )
+        if reclaimed:
+            print(f"Reclaimed {reclaimed} papers from workers that stopped responding.")
+        return items
+
+    def heartbeat(self, worker):
+        """Extend the lease on every paper `worker` holds; returns how many it still holds."""
+        return self.conn.execute(
+            "UPDATE items SET heartbeat = ? WHERE worker = ? AND status = 'claimed'", (time.time(), worker)
+        ).rowcount
+
+    def complete(self, worker, pdf_file, result):
+        """Mark a paper `worker` holds as done; returns False if its lease had passed to another worker."""
+        return self.conn.execute(
+            "UPDATE items SET status = 'done', result = ?, error = NULL, worker = NULL"
+            " WHERE pdf_file = ? AND worker = ? AND status = 'claimed'",
+            (result, pdf_file, worker)
+        ).rowcount == 1
+
+    def fail(self, worker, pdf_file, error, retry=False, result=None):
+        """Record a failure of a paper `worker` holds; with retry, it goes back to pending unless it is out of attempts.
+
+        `result` is an incomplete result to fall back on once the paper has failed for good.
+        Returns False if the paper's lease had passed to another worker.
+        """
+        with self._transaction():
+            attempts = self.conn.execute("SELECT attempts FROM items WHERE pdf_file = ?", (pdf_file,)).fetchone()[0]
+            status = 'pending' if retry and attempts < self.max_attempts else 'failed'
+            return self.conn.execute(
+                "UPDATE items SET status = ?, error = ?, result = ?, worker = NULL"
+                " WHERE pdf_file = ? AND worker = ? AND status = 'claimed'",
+                (status, error, result, pdf_file, worker)
+            ).rowcount == 1
+
+    def counts(self):
+        counts = dict.fromkeys(["pending", "claimed", "done", "failed"], 0)
+        counts.update(self.conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status"))
+        return counts
+
+    def unfinished(self):
+        counts = self.counts()
+        return counts["pending"] + counts["claimed"]
+
+    def results(self):
+        return self.conn.execute("SELECT pdf_file, result FROM items WHERE status = 'done' ORDER BY pdf_file").fetchall()
+
+    def failures(self):
+        """[(pdf_file, error, incomplete result or None)] of the papers that failed for good."""
+        return self.conn.execute(
+            "SELECT pdf_file, error, result FROM items WHERE status = 'failed' ORDER BY pdf_file"
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def _use_queue_prompts(settings):
+    # litsummarizer creates its API client on import, so only the functions that summarize
+    # import it; WorkQueue alone (e.g. for status checks) needs no credentials
+    import litsummarizer
+
+    if settings.get("prompts"):
+        litsummarizer.use_prompt_set(settings["prompts"])
+
+
+def enqueue_folder(folder_path, output_filename, queue_path, results_dir, prompts=None):
+    """Start a sharded run: queue every PDF of a folder that changed since output_filename was written.
+
+    Workers write one result file per paper to results_dir, which must be reachable from every
+    worker (shared storage when they run on several machines), as must the PDFs themselves.
+    Returns the number of papers queued.
+    """
+    import litsummarizer
+
+    if prompts is not None:
+        litsummarizer.use_prompt_set(prompts)
+    _, manifest = litsummarizer.current_manifest(output_filename)
+    pdf_files, entries, changed, removed = litsummarizer.scan_folder(folder_path, manifest)
+
+    queue = WorkQueue(queue_path)
+    queue.reset(
+        [(pdf_file, os.path.abspath(file_path), digest) for pdf_file, file_path, digest, _ in changed],
+        {"folder": os.path.abspath(folder_path), "output": os.path.abspath(output_filename),
+         "results_dir": os.path.abspath(results_dir), "prompts": prompts}
+    )
+    queue.close()
+    os.makedirs(results_dir, exist_ok=True)
+    print(f"Queued {len(changed)} new or modified PDFs ({len(entries)} unchanged, {len(removed)} removed).")
+    return len(changed)
+
+
+def _send_heartbeats(queue_path, worker, lease, stop):
+    # SQLite connections stay in the thread that made them, so the heartbeat gets its own
+    queue = WorkQueue(queue_path, lease=lease)
+    while not stop.wait(lease / 3):
+        try:
+            queue.heartbeat(worker)
+        except sqlite3.Error as e:
+            print(f"Heartbeat failed: {e}")
+    queue.close()
+
+
+def run_worker(queue_path, worker=None, claim_size=QUEUE_CLAIM_SIZE, lease=QUEUE_LEASE, poll_interval=10):
+    """Claim and summarize papers until the queue has no pending or claimed papers left.
+
+    While other workers still hold papers this worker waits, so it can take over the papers of
+    a worker that dies. Returns the number of papers this worker summarized.
+    """
+    import litsummarizer
+
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(queue_path, lease=lease)
+    settings = queue.settings()
+    _use_queue_prompts(settings)
+    results_dir = settings["results_dir"]
+    # Each worker writes its own result files, so a worker that lost its lease can't overwrite the new owner's
+    worker_tag = re.sub(r"[^\w.-]", "_", worker)
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_send_heartbeats, args=(queue_path, worker, lease, stop), daemon=True)
+    heartbeat.start()
+    done = 0
+    try:
+        while True:
+            claimed = queue.claim(worker, claim_size)
+            if not claimed:
+                if not queue.unfinished():
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            print(f"Worker {worker} claimed {len(claimed)} papers.")
+            documents = [(path, litsummarizer.cache.digest_key(digest)) for _, path, digest in claimed]
+            try:
+                stats = [os.stat(path) for path, _ in documents]
+                records = litsummarizer.summarize_documents(documents)
+            except Exception as e:
+                for pdf_file, _, _ in claimed:
+                    queue.fail(worker, pdf_file, f"{type(e).__name__}: {e}", retry=True)
+                print(f"Worker {worker} failed on {len(claimed)} papers: {e}")
+                continue
+
+            for (pdf_file, _, digest), stat, record in zip(claimed, stats, records):
+                if record is None:
+                    queue.fail(worker, pdf_file, "text extraction failed")
+                    continue
+                result_path = os.path.join(results_dir, f"{pdf_file}.{worker_tag}.json")
+                entry = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": digest, "record": record}
+                if litsummarizer.incomplete_record(record):
+                    # Failed requests aren't cached, so another attempt only resends those
+                    atomic_write_json(result_path, dict(entry, incomplete=True))
+                    owned = queue.fail(worker, pdf_file, "some answers or the metadata failed", retry=True,
+                                       result=result_path)
+                else:
+                    atomic_write_json(result_path, entry)
+                    owned = queue.complete(worker, pdf_file, result_path)
+                    done += owned
+                if not owned:
+                    print(f"Worker {worker} lost its lease on {pdf_file}; another worker has taken it over.")
+                    os.remove(result_path)
+    finally:
+        stop.set()
+        heartbeat.join()
+        queue.close()
+    telemetry.finish(f"Worker {worker}")
+    return done
+
+
+def merge_results(queue_path):
+    """Merge the workers' results with the unchanged rows into the run's workbook and manifest.
+
+    Returns the number of rows written, or None while papers are still pending or claimed.
+    """
+    import litsummarizer
+
+    queue = WorkQueue(queue_path)
+    settings = queue.settings()
+    _use_queue_prompts(settings)
+    if queue.unfinished():
+        print(f"{queue.unfinished()} papers are still queued or being processed.")
+        return None
+
+    output_filename = settings["output"]
+    manifest_path, manifest = litsummarizer.current_manifest(output_filename)
+    pdf_files, entries, _, _ = litsummarizer.scan_folder(settings["folder"], manifest)
+
+    for pdf_file, result_path in queue.results():
+        with open(result_path, 'r') as f:
+            entries[pdf_file] = json.load(f)
+    failures = queue.failures()
+    queue.close()
+    if failures:
+        print(f"{len(failures)} papers failed:")
+        for pdf_file, error, result_path in failures:
+            print(f"  {pdf_file}: {error}")
+            # Rows with failed answers are kept, marked incomplete so the next run retries them
+            if result_path:
+                with open(result_path, 'r') as f:
+                    entries[pdf_file] = json.load(f)
+
+    rows = litsummarizer.write_summary(pdf_files, entries, output_filename)
+    manifest["files"] = entries
+    litsummarizer.save_manifest(manifest_path, manifest)
+    print(f"Summary of {rows} papers saved to '{output_filename}'.")
+    return rows
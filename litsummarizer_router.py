@@ -0,0 +1,182 @@
+import json
+import os
+import time
+
+import litsummarizer
+import litsummarizer_async
+from litsummarizer_batchmode import cache_batch_outputs, write_batch_inputs
+from litsummarizer_chunking import get_tokenizer
+from litsummarizer_jobs import BatchJobManager
+from litsummarizer_telemetry import telemetry, token_cost
+
+# How long the Batch API may take to return results (its completion window); batch is only
+# chosen when the deadline leaves at least this much time
+BATCH_TURNAROUND = float(os.environ.get("LITSUMMARIZER_BATCH_TURNAROUND", 24 * 3600))
+# Typical latency of one realtime request, for estimating how long a realtime run takes
+REALTIME_SECONDS_PER_REQUEST = 5.0
+# Expected answer length per request stage (per question for structured requests)
+COMPLETION_TOKENS = {"metadata": 40, "summary": 120, "structured_summary": 120}
+
+ROUTER_STATE_FILE = "router_batches.json"
+ROUTER_INPUT_FILE = "router_input.jsonl"
+
+
+def request_tokens(request):
+    """Prompt tokens of a chat completion request, counted with the model's tokenizer."""
+    tokenizer = get_tokenizer()
+    tokens = sum(len(tokenizer.encode_ordinary(m["content"])) + 4 for m in request["messages"]) + 3
+    if request.get("response_format"):
+        tokens += len(tokenizer.encode_ordinary(json.dumps(request["response_format"])))
+    return tokens
+
+
+def estimate_plan(plan):
+    """Tokens, cost on either route and realtime duration of {(stage, ...): request}."""
+    input_tokens = output_tokens = limiter_tokens = 0
+    realtime_cost = batch_cost = 0.0
+    for key, request in plan.items():
+        prompt_tokens = request_tokens(request)
+        completion_tokens = COMPLETION_TOKENS.get(key[0], 120)
+        if request.get("response_format"):
+            completion_tokens *= len(request["response_format"]["json_schema"]["schema"]["properties"])
+        input_tokens += prompt_tokens
+        output_tokens += completion_tokens
+        limiter_tokens += litsummarizer_async.estimate_tokens(request["messages"], request.get("max_tokens"))
+        realtime_cost += token_cost(request["model"], prompt_tokens, completion_tokens)
+        batch_cost += token_cost(request["model"], prompt_tokens, completion_tokens, batch=True)
+    # Realtime runs are bound by the token rate limit or by latency at full concurrency
+    realtime_seconds = max(
+        60 * limiter_tokens / litsummarizer_async.TOKENS_PER_MINUTE,
+        len(plan) * REALTIME_SECONDS_PER_REQUEST / litsummarizer_async.MAX_CONCURRENCY
+    )
+    return {
+        "requests": len(plan), "input_tokens": input_tokens, "output_tokens": output_tokens,
+        "realtime_cost": realtime_cost, "batch_cost": batch_cost, "realtime_seconds": realtime_seconds
+    }
+
+
+def choose_route(estimate, deadline=None, budget=None):
+    """Pick "realtime" or "batch" for a run; returns (route or None if no route fits, reason).
+
+    `deadline` is seconds from now, `budget` USD. The cheapest route that meets both wins.
+    Without a deadline results are wanted as soon as possible, so batch is only used when the
+    budget rules out realtime.
+    """
+    if not estimate["requests"]:
+        return "realtime", "every request is answered from the cache"
+    realtime_cost, batch_cost = estimate["realtime_cost"], estimate["batch_cost"]
+    realtime_in_time = deadline is None or estimate["realtime_seconds"] <= deadline
+    batch_in_time = deadline is not None and deadline >= BATCH_TURNAROUND
+    realtime_affordable = budget is None or realtime_cost <= budget
+    batch_affordable = budget is None or batch_cost <= budget
+
+    turnaround = f"{BATCH_TURNAROUND / 3600:g}h"
+    if batch_in_time and batch_affordable:
+        return "batch", f"the deadline allows the Batch API's turnaround, at ${batch_cost:.2f} instead of ${realtime_cost:.2f}"
+    if realtime_in_time and realtime_affordable:
+        reason = "no deadline given, so results are wanted now" if deadline is None else \
+            f"the deadline is too close for the Batch API's {turnaround} turnaround"
+        return "realtime", reason + ("" if budget is None else f", and ${realtime_cost:.2f} fits the budget")
+    if not realtime_in_time and not batch_in_time:
+        return None, (f"realtime needs about {estimate['realtime_seconds'] / 60:.0f} min, more than the "
+                      f"deadline allows, and the Batch API may take up to {turnaround}")
+    if batch_affordable:
+        return None, f"only the Batch API (${batch_cost:.2f}) fits the ${budget:.2f} budget, but it may take up to {turnaround}"
+    return None, f"even the Batch API (${batch_cost:.2f}) exceeds the ${budget:.2f} budget"
+
+
+def describe_estimate(estimate):
+    return (f"{estimate['requests']} requests, ~{estimate['input_tokens']} input and ~{estimate['output_tokens']} "
+            f"output tokens: ${estimate['realtime_cost']:.2f} realtime (~{estimate['realtime_seconds'] / 60:.0f} min), "
+            f"${estimate['batch_cost']:.2f} with the Batch API")
+
+
+def plan_folder(folder_path, output_filename):
+    """{(stage, ...): request} for what process_folder() would still have to send, cached requests left out."""
+    _, manifest = litsummarizer.current_manifest(output_filename)
+    _, entries, changed, _ = litsummarizer.scan_folder(folder_path, manifest)
+    if not changed:
+        return {}
+    known = {pdf_file: (litsummarizer.cache.digest_key(entry["hash"]), entry["record"]) for pdf_file, entry in entries.items()}
+    plan = litsummarizer.plan_documents(
+        [(file_path, litsummarizer.cache.digest_key(digest)) for _, file_path, digest, _ in changed], known
+    )
+    return {key: request for key, request in plan.items() if not litsummarizer.response_cache.contains(request)}
+
+
+def wait_for_batches(manager, until=None):
+    """Poll until every batch has finished, or until the `until` timestamp; returns True if all finished."""
+    while manager.poll_once():
+        next_poll = min(manager.jobs[batch_id]["next_poll"] for batch_id in manager.active_jobs())
+        if until is not None and next_poll > until:
+            return False
+        time.sleep(max(0, next_poll - time.time()))
+    return True
+
+
+def run_job(folder_path, output_filename, deadline=None, budget=None, route="auto", prompts=None, mode=None,
+            state_path=ROUTER_STATE_FILE, jsonl_file=ROUTER_INPUT_FILE, dry_run=False):
+    """Summarize a folder into output_filename, sending its requests realtime or through the Batch API.
+
+    Both routes send the realtime pipeline's requests, and the rows are always built by
+    process_folder(): batch answers are loaded into the response cache and replayed, so the
+    workbook is identical either way. With route="auto" the route comes from choose_route().
+    Batches still running when the deadline comes close are cancelled and their requests sent
+    realtime. A run interrupted while waiting resumes its batches from state_path, unless
+    route="realtime" is given, which cancels them instead. Batches of a different folder,
+    output, prompt set or mode are never resumed.
+    Returns the route taken, or None if no route fits the deadline and budget (or state_path
+    belongs to another run).
+    """
+    start = time.time()
+    if prompts is not None:
+        litsummarizer.use_prompt_set(prompts)
+    if mode is not None:
+        litsummarizer.SUMMARY_MODE = mode
+
+    with telemetry.span("plan"):
+        plan = plan_folder(folder_path, output_filename)
+    estimate = estimate_plan(plan)
+    print(f"Estimate: {describe_estimate(estimate)}")
+    run_info = {"folder": os.path.abspath(folder_path), "output": os.path.abspath(output_filename),
+                "prompts": litsummarizer.prompt_fingerprint(), "mode": litsummarizer.SUMMARY_MODE}
+    manager = BatchJobManager(os.environ.get("OPENAI_API_KEY"), state_path=state_path)
+    resuming = bool(manager.jobs or manager.inputs)
+    if resuming and manager.run_info != run_info:
+        print(f"'{state_path}' holds the batches of another run ({manager.run_info.get('folder')} into "
+              f"{manager.run_info.get('output')}, or different prompts or mode). Finish that run first, "
+              "or delete the file to start over.")
+        return None
+    if resuming and route != "realtime":
+        print(f"Resuming {len(manager.active_jobs())} unfinished batch jobs from '{state_path}'.")
+        route = "batch"
+    elif route == "auto":
+        route, reason = choose_route(estimate, deadline, budget)
+        print(f"Route: {route or 'none'} ({reason})")
+    if route is None or dry_run:
+        return route
+
+    if route == "batch":
+        if not resuming and plan:
+            manager.run_info = run_info
+            manager.add_inputs(write_batch_inputs(plan, jsonl_file))
+        # Also finishes a submission that was interrupted before every part was sent
+        manager.submit_inputs()
+        # Stop waiting early enough to send whatever is left realtime before the deadline
+        until = None if deadline is None else start + deadline - 2 * estimate["realtime_seconds"]
+        if not wait_for_batches(manager, until):
+            print(f"{len(manager.active_jobs())} batches are not done in time; cancelling them and "
+                  "sending their requests realtime.")
+            manager.cancel_active()
+    elif manager.active_jobs():
+        print(f"Cancelling {len(manager.active_jobs())} unfinished batches from '{state_path}'; "
+              "their unanswered requests are sent realtime.")
+        manager.cancel_active()
+    if manager.jobs:
+        stored = cache_batch_outputs(manager, litsummarizer.response_cache, record_usage=True)
+        print(f"{stored} batch responses loaded into the response cache.")
+
+    litsummarizer.process_folder(folder_path, output_filename)
+    # Every answer is in the workbook and manifest now; the next run starts afresh
+    manager.clear()
+    return route
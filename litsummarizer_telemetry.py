@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Set LITSUMMARIZER_METRICS to stream every event as JSONL, and LITSUMMARIZER_METRICS_PROM to
+# write Prometheus text-format totals when a run finishes
+METRICS_FILE = os.environ.get("LITSUMMARIZER_METRICS")
+PROMETHEUS_FILE = os.environ.get("LITSUMMARIZER_METRICS_PROM")
+
+# USD per million (input, output) tokens; the Batch API bills half
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+BATCH_DISCOUNT = 0.5
+
+
+def token_cost(model, prompt_tokens, completion_tokens, batch=False):
+    """Estimated USD cost of one request; unknown models cost 0."""
+    for name in sorted(PRICES, key=len, reverse=True):
+        if model and model.startswith(name):
+            input_price, output_price = PRICES[name]
+            break
+    else:
+        return 0.0
+    cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1e6
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Telemetry:
+    """Per-stage timing spans, token/cost accounting and retry counts for a pipeline run.
+
+    Events carry free-form labels (paper, prompt, chunk, ...); totals are kept per stage.
+    reset() starts a new run; the totals of earlier runs are kept for the session summary.
+    """
+
+    def __init__(self, metrics_file=METRICS_FILE):
+        self.metrics_file = metrics_file
+        self.lock = threading.Lock()
+        self.paper_names = {}
+        self.session_durations = defaultdict(list)
+        self.session_totals = defaultdict(lambda: defaultdict(float))
+        self.session_started = time.time()
+        self.durations, self.totals = {}, {}
+        self.reset()
+
+    def reset(self):
+        """Start a new run, folding the current run's numbers into the session totals."""
+        with self.lock:
+            for stage, durations in self.durations.items():
+                self.session_durations[stage].extend(durations)
+            for stage, totals in self.totals.items():
+                for name, value in totals.items():
+                    self.session_totals[stage][name] += value
+            self.durations = defaultdict(list)
+            self.totals = defaultdict(lambda: defaultdict(float))
+            self.started = time.time()
+
+    def _session(self):
+        """(durations, totals) of every run so far, the current one included."""
+        durations = defaultdict(list, {stage: list(values) for stage, values in self.session_durations.items()})
+        totals = defaultdict(lambda: defaultdict(float))
+        for source in (self.session_totals, self.totals):
+            for stage, values in source.items():
+                for name, value in values.items():
+                    totals[stage][name] += value
+        for stage, values in self.durations.items():
+            durations[stage].extend(values)
+        return durations, totals
+
+    def name_paper(self, key, name):
+        """Remember a readable name (the PDF file name) for a paper's cache key."""
+        self.paper_names[key] = name
+
+    def paper_name(self, key):
+        return self.paper_names.get(key, key)
+
+    def _emit(self, event, stage, labels, **fields):
+        if not self.metrics_file:
+            return
+        line = json.dumps({"time": time.time(), "event": event, "stage": stage, **labels, **fields}, default=str)
+        with self.lock:
+            with open(self.metrics_file, 'a') as f:
+                f.write(line + "\n")
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Time a block of work under `stage`."""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.record_duration(stage, time.perf_counter() - start, error=error, **labels)
+
+    def record_duration(self, stage, seconds, error=None, **labels):
+        with self.lock:
+            self.durations[stage].append(seconds)
+            self.totals[stage]["errors"] += error is not None
+        self._emit("span", stage, labels, seconds=round(seconds, 6), error=error)
+
+    def record_usage(self, stage, model, usage, batch=False, **labels):
+        """Account the tokens and cost of one response; `usage` is an SDK object or a dict."""
+        if usage is None:
+            return
+        if isinstance(usage, dict):
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        else:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cost = token_cost(model, prompt_tokens, completion_tokens, batch)
+        with self.lock:
+            totals = self.totals[stage]
+            totals["requests"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] += cost
+        self._emit("usage", stage, labels, model=model, batch=batch, prompt_tokens=prompt_tokens,
+                   completion_tokens=completion_tokens, cost_usd=round(cost, 8))
+
+    def record_retry(self, stage, reason, **labels):
+        with self.lock:
+            self.totals[stage]["retries"] += 1
+        self._emit("retry", stage, labels, reason=reason)
+
+    def count(self, stage, name, value=1, **labels):
+        """Increment any other per-stage counter (cache hits, batch polls, ...)."""
+        with self.lock:
+            self.totals[stage][name] += value
+        self._emit("count", stage, labels, name=name, value=value)
+
+    def summary_table(self, session=False):
+        """Per-stage totals of the current run (with session, of every run so far) as a printable table."""
+        durations_by_stage, totals_by_stage = self._session() if session else (self.durations, self.totals)
+        started = self.session_started if session else self.started
+        stages = list(dict.fromkeys(list(durations_by_stage) + list(totals_by_stage)))
+        header = (f"{'stage':<16}{'spans':>7}{'total s':>10}{'mean s':>9}{'p95 s':>9}{'requests':>10}"
+                  f"{'prompt tok':>12}{'compl tok':>11}{'cost $':>10}{'cached':>8}{'retries':>9}{'errors':>8}")
+        rows = [header, "-" * len(header)]
+        grand = defaultdict(float)
+        for stage in stages:
+            durations = durations_by_stage.get(stage, [])
+            totals = totals_by_stage.get(stage, {})
+            total_seconds = sum(durations)
+            rows.append(
+                f"{stage:<16}{len(durations):>7}{total_seconds:>10.2f}"
+                f"{(total_seconds / len(durations) if durations else 0):>9.3f}"
+                f"{(_percentile(durations, 0.95) if durations else 0):>9.3f}"
+                f"{int(totals.get('requests', 0)):>10}{int(totals.get('prompt_tokens', 0)):>12}"
+                f"{int(totals.get('completion_tokens', 0)):>11}{totals.get('cost_usd', 0):>10.4f}"
+                f"{int(totals.get('cache_hits', 0)):>8}{int(totals.get('retries', 0)):>9}{int(totals.get('errors', 0)):>8}"
+            )
+            for key in ("requests", "prompt_tokens", "completion_tokens", "cost_usd", "cache_hits", "retries"):
+                grand[key] += totals.get(key, 0)
+        rows.append("-" * len(header))
+        rows.append(
+            f"{'total':<16}{'':>7}{time.time() - started:>10.2f}{'':>9}{'':>9}{int(grand['requests']):>10}"
+            f"{int(grand['prompt_tokens']):>12}{int(grand['completion_tokens']):>11}{grand['cost_usd']:>10.4f}"
+            f"{int(grand['cache_hits']):>8}{int(grand['retries']):>9}{'':>8}"
+        )
+        return "\n".join(rows)
+
+    def prometheus(self, session=False):
+        """Per-stage totals (with session, of every run so far) in the Prometheus text exposition format."""
+        durations_by_stage, totals_by_stage = self._session() if session else (self.durations, self.totals)
+        lines = [
+            "# TYPE litsummarizer_stage_seconds summary",
+        ]
+        for stage, durations in durations_by_stage.items():
+            lines.append(f'litsummarizer_stage_seconds_sum{{stage="{stage}"}} {sum(durations):.6f}')
+            lines.append(f'litsummarizer_stage_seconds_count{{stage="{stage}"}} {len(durations)}')
+        metrics = defaultdict(list)
+        for stage, totals in totals_by_stage.items():
+            for name, value in totals.items():
+                metrics[name].append(f'litsummarizer_{name}_total{{stage="{stage}"}} {value:g}')
+        for name, samples in metrics.items():
+            lines.append(f"# TYPE litsummarizer_{name}_total counter")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def finish(self, title="Run summary", session=False):
+        """Print the summary table (with session, for every run so far) and write the Prometheus file if configured."""
+        print(f"\n{title}:\n{self.summary_table(session)}")
+        if PROMETHEUS_FILE:
+            with open(PROMETHEUS_FILE, 'w') as f:
+                f.write(self.prometheus(session))
+            print(f"Metrics written to {PROMETHEUS_FILE}")
+
+
+telemetry = Telemetry()
@@ -0,0 +1,56 @@
+import re
+
+# C0 and C1 control characters; openpyxl refuses most of them and Excel shows the rest as boxes
+_CONTROL_CHARACTERS = [*range(0x00, 0x20), *range(0x7F, 0xA0)]
+_LINE_BREAKS = [ord('\t'), ord('\n'), ord('\r')]
+
+# Typographic punctuation folded to ASCII, and invisible characters dropped
+_PUNCTUATION = {
+    **dict.fromkeys(map(ord, '“”„‟″'), '"'),
+    **dict.fromkeys(map(ord, '‘’‚‛′'), "'"),
+    **dict.fromkeys(map(ord, '‐‑‒–—―−'), '-'),
+    ord('…'): '...',
+    **dict.fromkeys(map(ord, '   '), ' '),
+    **dict.fromkeys(map(ord, '­​‌‍⁠﻿￾￿'), None),
+}
+
+
+def _cleaner(deleted):
+    """Build a one-pass cleanup: str.translate for pure-ASCII text (CPython's fast path), otherwise
+    one regex over the characters to change (translate is slow on non-ASCII strings)."""
+    mapping = {**dict.fromkeys(map(chr, deleted), ''), **{chr(k): v or '' for k, v in _PUNCTUATION.items()}}
+    ascii_table = {ord(c): v or None for c, v in mapping.items() if ord(c) < 128}
+    pattern = re.compile('[' + ''.join(map(re.escape, mapping)) + ']')
+    replace = lambda match: mapping[match.group()]
+
+    def clean(text):
+        if text.isascii():
+            return text.translate(ascii_table)
+        return pattern.sub(replace, text)
+    return clean
+
+
+_clean_for_excel = _cleaner(_CONTROL_CHARACTERS)
+_clean_for_excel_keep_lines = _cleaner([c for c in _CONTROL_CHARACTERS if c not in _LINE_BREAKS])
+
+
+def clean_text_for_excel(text, keep_newlines=False):
+    """Make text safe for an Excel cell in one pass: drop control characters, fold curly quotes and dashes.
+
+    Tabs and line breaks are dropped too unless keep_newlines is set (for multi-line answers
+    such as bullet lists).
+    """
+    if text is None:
+        return ""
+    if not isinstance(text, str):
+        text = str(text)
+    return (_clean_for_excel_keep_lines if keep_newlines else _clean_for_excel)(text)
+
+
+def clean_text(text):
+    """Collapse every run of whitespace to one space and trim the ends.
+
+    Same result as substituting a whitespace regex and stripping (both follow str.isspace()),
+    without the regex engine.
+    """
+    return ' '.join(text.split())